@@ -0,0 +1,39 @@
+"""Compare two result files written by benchmarks/run.py.
+
+    python benchmarks/compare.py before.json after.json
+"""
+import sys
+import json
+
+def _change(old, new):
+    if old is None or new is None or not old:
+        return "      -"
+    return "%+6.1f%%" % ((new - old) * 100 / old)
+
+def main(argv):
+    if len(argv) != 2:
+        print(__doc__)
+        return 2
+    with open(argv[0]) as f:
+        before = json.load(f)
+    with open(argv[1]) as f:
+        after = json.load(f)
+    if before["implementation"] != after["implementation"]:
+        print("⚠️  Comparing %s against %s results" % (before["implementation"], after["implementation"]))
+    print("%-28s %14s %8s %12s %8s %10s %8s" % ("benchmark", "ops/s", "", "B/op", "", "B/record", ""))
+    for name, new in after["results"].items():
+        old = before["results"].get(name)
+        if old is None:
+            print("%-28s %14.1f (new)" % (name, new["ops_per_sec"]))
+            continue
+        alloc = new.get("alloc_bytes_per_op")
+        encoded = new.get("encoded_bytes_per_record")
+        print("%-28s %14.1f %8s %12s %8s %10s %8s" % (
+            name,
+            new["ops_per_sec"], _change(old["ops_per_sec"], new["ops_per_sec"]),
+            "-" if alloc is None else alloc, _change(old.get("alloc_bytes_per_op"), alloc),
+            "-" if encoded is None else encoded, _change(old.get("encoded_bytes_per_record"), encoded)))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
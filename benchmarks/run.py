@@ -0,0 +1,376 @@
+"""Micro-benchmarks for the client hot paths.
+
+Runs on CPython and on the MicroPython unix port:
+
+    python benchmarks/run.py [--quick] [--filter NAME] [--output results.json]
+    micropython benchmarks/run.py [--quick] [--filter NAME] [--output results.json]
+
+For every benchmark it reports operations per second, bytes allocated per
+operation and, for the encoders, encoded bytes per record. The results are
+written as JSON so two revisions can be compared with benchmarks/compare.py.
+"""
+import sys
+import gc
+
+_here = __file__.rpartition("/")[0] or "."
+sys.path.insert(0, _here + "/..")
+# Stubs go last so the real modules win wherever they exist (MicroPython)
+sys.path.append(_here + "/stubs")
+
+import json
+
+try:
+    from time import ticks_us, ticks_diff
+except ImportError:
+    from time import perf_counter
+
+    def ticks_us():
+        return int(perf_counter() * 1000000)
+
+    def ticks_diff(a, b):
+        return a - b
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+import opentelemetry_client
+from opentelemetry_client import (OpenTelemetryClient, BatchSpanProcessor, BatchLogRecordProcessor,
+                                  CircuitBreaker, SpanRecords, decode_traceparent, encode_traceparent)
+from opentelemetry_transport import UrequestsTransport, StreamBase
+from opentelemetry_metrics import Meter
+from opentelemetry_sampling import AlwaysOffSampler
+from opentelemetry_statsd import StatsdExporter
+
+RESOURCE = {"service.name": "benchmark", "service.version": "0.1", "host.name": "bench"}
+ATTRIBUTES = {"http.method": "GET", "http.route": "/sensor", "sensor.id": "bme280", "attempt": 2}
+TRACEPARENT = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+BATCH = 32
+
+class DownTransport:
+    """A collector that refuses every connection."""
+    def send(self, path, body, headers=None):
+        raise OSError(111)
+
+    def close(self):
+        pass
+
+def make_client(wire_format="json", sampler=None):
+    # Finished spans and logs are discarded, so only the recording path is measured
+    return OpenTelemetryClient(
+        None, "127.0.0.1", 4318, resource_attributes=RESOURCE, sync_time=False,
+        transport=UrequestsTransport("127.0.0.1", 4318), wire_format=wire_format, sampler=sampler,
+        span_processor=BatchSpanProcessor(export=lambda spans: None),
+        log_processor=BatchLogRecordProcessor(export=lambda records, dropped: None))
+
+def bench_generate_trace_id():
+    client = make_client()
+    return client.generate_trace_id, None
+
+def bench_generate_span_id():
+    client = make_client()
+    return client.generate_span_id, None
+
+def bench_start_end_trace():
+    client = make_client()
+
+    def op():
+        trace_id, span_id = client.start_trace("read_sensor", kind="INTERNAL", attributes=ATTRIBUTES)
+        client.end_trace(span_id)
+    return op, None
+
+def bench_start_end_trace_unsampled():
+    client = make_client(sampler=AlwaysOffSampler())
+
+    def op():
+        trace_id, span_id = client.start_trace("read_sensor", kind="INTERNAL", attributes=ATTRIBUTES)
+        client.end_trace(span_id)
+    return op, None
+
+def bench_format_attributes():
+    client = make_client()
+    return lambda: client.format_attributes(ATTRIBUTES), None
+
+def bench_bind_attributes():
+    return lambda: opentelemetry_client.bind_attributes(ATTRIBUTES), None
+
+def bench_start_end_trace_bound():
+    client = make_client()
+    attributes = client.bind_attributes(ATTRIBUTES)
+
+    def op():
+        trace_id, span_id = client.start_trace("read_sensor", kind="INTERNAL", attributes=attributes)
+        client.end_trace(span_id)
+    return op, None
+
+def bench_log():
+    client = make_client()
+    trace_id, span_id = client.generate_trace_id(), client.generate_span_id()
+    return lambda: client.log(trace_id, span_id, "sensor read", ATTRIBUTES), None
+
+def bench_collector_down():
+    # The first export fails and opens the breaker; after that spans and logs only queue up
+    client = OpenTelemetryClient(None, "127.0.0.1", 4318, resource_attributes=RESOURCE, sync_time=False,
+                                 transport=DownTransport(), circuit_breaker=CircuitBreaker(initial_backoff_ms=3600000))
+    client.send_log("collector down")
+
+    def op():
+        trace_id, span_id = client.start_trace("read_sensor", kind="INTERNAL", attributes=ATTRIBUTES)
+        client.log(trace_id, span_id, "sensor read", ATTRIBUTES)
+        client.end_trace(span_id)
+        client.poll()
+    return op, None
+
+def bench_traceparent_decode():
+    return lambda: decode_traceparent(TRACEPARENT), None
+
+def bench_traceparent_encode():
+    client = make_client()
+    trace_id, span_id = client.generate_trace_id(), client.generate_span_id()
+    return lambda: encode_traceparent(trace_id, span_id, 1), None
+
+def _finished_spans(client):
+    spans = []
+    client.span_processor.export = spans.extend
+    for _ in range(BATCH):
+        trace_id, span_id = client.start_trace("read_sensor", kind="INTERNAL", attributes=ATTRIBUTES)
+        client.get_span(span_id).add_event("retry", {"attempt": 2})
+        client.end_trace(span_id)
+    client.span_processor.flush()
+    return spans
+
+def _encode_spans(wire_format):
+    client = make_client(wire_format)
+    spans = _finished_spans(client)
+    envelope = client._envelope("/v1/traces")
+
+    return lambda: client._encode(envelope, SpanRecords(spans, client._encode_id)), BATCH
+
+def bench_encode_spans_json():
+    return _encode_spans("json")
+
+def bench_encode_spans_protobuf():
+    return _encode_spans("protobuf")
+
+class _NullStream(StreamBase):
+    def __init__(self):
+        self.bytes_written = 0
+
+    def write(self, data):
+        self.bytes_written += len(data)
+        return len(data)
+
+def _stream_spans(wire_format):
+    # What streaming=True does per export, minus the socket: B/op is the encoder's peak
+    client = make_client(wire_format)
+    spans = _finished_spans(client)
+    envelope = client._envelope("/v1/traces")
+
+    def op():
+        stream = _NullStream()
+        client._stream_encode(envelope, SpanRecords(spans, client._encode_id), stream)
+        return stream.bytes_written
+    return op, BATCH
+
+def bench_stream_spans_json():
+    return _stream_spans("json")
+
+def bench_stream_spans_protobuf():
+    return _stream_spans("protobuf")
+
+def _encode_logs(wire_format):
+    client = make_client(wire_format)
+    trace_id, span_id = client.generate_trace_id(), client.generate_span_id()
+    records = []
+    client.log_processor.export = lambda batch, dropped: records.extend(batch)
+    for _ in range(BATCH):
+        client.log(trace_id, span_id, "sensor read", ATTRIBUTES)
+    client.log_processor.flush()
+    encode_id = client._encode_id
+    for record in records:
+        record["traceId"] = encode_id(record["traceId"])
+        record["spanId"] = encode_id(record["spanId"])
+    envelope = client._envelope("/v1/logs")
+    return lambda: client._encode(envelope, records), BATCH
+
+def bench_encode_logs_json():
+    return _encode_logs("json")
+
+def bench_encode_logs_protobuf():
+    return _encode_logs("protobuf")
+
+def _encode_metrics(wire_format):
+    client = make_client(wire_format)
+    meter = Meter(client)
+    counter = meter.create_counter("requests")
+    histogram = meter.create_histogram("duration", unit="ms")
+    for i in range(BATCH // 2):
+        counter.add(1, {"route": i})
+        histogram.record(i * 3.5, {"route": i})
+    metrics = meter.collect()
+    envelope = client._envelope("/v1/metrics")
+    return lambda: client._encode(envelope, metrics), BATCH
+
+def bench_encode_metrics_json():
+    return _encode_metrics("json")
+
+def bench_encode_metrics_protobuf():
+    return _encode_metrics("protobuf")
+
+def bench_counter_add():
+    meter = Meter(make_client())
+    counter = meter.create_counter("requests")
+    return lambda: counter.add(1, {"http.method": "GET"}), None
+
+def bench_counter_add_bound():
+    meter = Meter(make_client())
+    counter = meter.create_counter("requests")
+    attributes = opentelemetry_client.bind_attributes({"http.method": "GET"})
+    return lambda: counter.add(1, attributes), None
+
+def bench_histogram_record():
+    meter = Meter(make_client())
+    histogram = meter.create_histogram("duration", unit="ms")
+    return lambda: histogram.record(12.5, {"http.method": "GET"}), None
+
+def bench_collect_observables():
+    # One collection cycle over eight sensors whose readings are ready immediately
+    client = make_client()
+    meter = Meter(client)
+    for i in range(8):
+        meter.create_observable_gauge("sensor.%d" % i, lambda: 21.5, "Cel")
+    return meter.collect, None
+
+def bench_statsd_gauge():
+    # Datagrams go to the discard port on loopback; nothing listens or answers
+    client = make_client()
+    StatsdExporter(client, "127.0.0.1", 9)
+    attributes = client.bind_attributes({"sensor.id": "bme280"})
+    return lambda: client.send_gauge_metric("temperature", 21.5, attributes), None
+
+BENCHMARKS = [
+    ("generate_trace_id", bench_generate_trace_id),
+    ("generate_span_id", bench_generate_span_id),
+    ("start_end_trace", bench_start_end_trace),
+    ("start_end_trace_unsampled", bench_start_end_trace_unsampled),
+    ("start_end_trace_bound", bench_start_end_trace_bound),
+    ("format_attributes", bench_format_attributes),
+    ("bind_attributes", bench_bind_attributes),
+    ("log", bench_log),
+    ("collector_down", bench_collector_down),
+    ("traceparent_decode", bench_traceparent_decode),
+    ("traceparent_encode", bench_traceparent_encode),
+    ("encode_spans_json", bench_encode_spans_json),
+    ("encode_spans_protobuf", bench_encode_spans_protobuf),
+    ("stream_spans_json", bench_stream_spans_json),
+    ("stream_spans_protobuf", bench_stream_spans_protobuf),
+    ("encode_logs_json", bench_encode_logs_json),
+    ("encode_logs_protobuf", bench_encode_logs_protobuf),
+    ("encode_metrics_json", bench_encode_metrics_json),
+    ("encode_metrics_protobuf", bench_encode_metrics_protobuf),
+    ("counter_add", bench_counter_add),
+    ("counter_add_bound", bench_counter_add_bound),
+    ("histogram_record", bench_histogram_record),
+    ("collect_observables", bench_collect_observables),
+    ("statsd_gauge", bench_statsd_gauge),
+]
+
+def time_op(op, min_us):
+    # Grow the batch until one run takes long enough for the clock resolution not to matter
+    n = 1
+    while True:
+        gc.collect()
+        start = ticks_us()
+        for _ in range(n):
+            op()
+        elapsed = ticks_diff(ticks_us(), start)
+        if elapsed >= min_us:
+            return n * 1000000 / elapsed
+        n *= 2
+
+def alloc_per_op(op, n):
+    gc.collect()
+    if hasattr(gc, "mem_alloc"):
+        # MicroPython: with the collector paused, every allocation shows up in mem_alloc
+        gc.disable()
+        try:
+            before = gc.mem_alloc()
+            for _ in range(n):
+                op()
+            used = gc.mem_alloc() - before
+        finally:
+            gc.enable()
+        return used / n
+    if tracemalloc is not None:
+        # CPython has no allocation counter: take how far one call pushes the traced memory above
+        # where it started (what that call had live at once), and the median over n single calls
+        # so an occasional batch export or resize doesn't skew it
+        tracemalloc.start()
+        op()
+        peaks = []
+        for _ in range(n):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            op()
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+        tracemalloc.stop()
+        peaks.sort()
+        return peaks[n // 2]
+    return None
+
+def run(names=None, quick=False):
+    results = {}
+    for name, setup in BENCHMARKS:
+        if names and not any(part in name for part in names):
+            continue
+        op, records = setup()
+        op()  # warm up caches (envelopes, imports)
+        ops = time_op(op, 100000 if quick else 1000000)
+        alloc = alloc_per_op(op, 10 if quick else 50)
+        result = {"ops_per_sec": round(ops, 1), "alloc_bytes_per_op": None if alloc is None else round(alloc, 1)}
+        if records:
+            body = op()
+            # Streaming benchmarks return the number of bytes written instead of a body
+            size = body if isinstance(body, int) else len(body)
+            result["encoded_bytes_per_record"] = round(size / records, 1)
+        results[name] = result
+        print("%-28s %12.1f ops/s %10s B/op %8s B/record" % (
+            name, ops, "-" if alloc is None else "%.1f" % alloc,
+            "%.1f" % result["encoded_bytes_per_record"] if records else "-"))
+    return results
+
+def main(argv):
+    output = "bench_results.json"
+    quick = False
+    names = []
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        if arg == "--output":
+            i += 1
+            output = argv[i]
+        elif arg == "--quick":
+            quick = True
+        elif arg == "--filter":
+            i += 1
+            names.append(argv[i])
+        else:
+            print("Unknown argument:", arg)
+            return 2
+        i += 1
+    impl = sys.implementation
+    print("Running on %s %s" % (impl.name, ".".join(str(v) for v in impl.version[:3])))
+    results = run(names, quick)
+    with open(output, "w") as f:
+        json.dump({
+            "implementation": impl.name,
+            "version": ".".join(str(v) for v in impl.version[:3]),
+            "quick": quick,
+            "results": results,
+        }, f)
+    print("Results written to", output)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
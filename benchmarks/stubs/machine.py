@@ -0,0 +1,33 @@
+# CPython stand-in for the parts of `machine` the sleep support uses. RTC memory
+# lives in RTC_MEMORY_FILE when that is set, so it outlives the process the way
+# real RTC memory outlives a deep sleep; deepsleep() just ends the process.
+import os
+import sys
+
+PWRON_RESET = 1
+DEEPSLEEP_RESET = 4
+
+RTC_MEMORY_FILE = os.environ.get("MACHINE_RTC_MEMORY")
+_memory = b""
+
+class RTC:
+    def memory(self, data=None):
+        global _memory
+        if data is None:
+            if RTC_MEMORY_FILE is not None:
+                try:
+                    with open(RTC_MEMORY_FILE, "rb") as f:
+                        return f.read()
+                except OSError:
+                    return b""
+            return _memory
+        _memory = bytes(data)
+        if RTC_MEMORY_FILE is not None:
+            with open(RTC_MEMORY_FILE, "wb") as f:
+                f.write(_memory)
+
+def reset_cause():
+    return DEEPSLEEP_RESET if RTC().memory() else PWRON_RESET
+
+def deepsleep(ms=0):
+    sys.exit(0)
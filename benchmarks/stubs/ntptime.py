@@ -0,0 +1,3 @@
+# Stand-in for ntptime so sync_time() returns at once
+def settime():
+    pass
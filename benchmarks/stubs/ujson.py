@@ -0,0 +1,11 @@
+# CPython stand-in for MicroPython's ujson, with its compact separators
+import json
+
+def dumps(obj):
+    return json.dumps(obj, separators=(",", ":"))
+
+def dump(obj, stream):
+    stream.write(dumps(obj))
+
+loads = json.loads
+load = json.load
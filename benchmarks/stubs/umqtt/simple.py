@@ -0,0 +1,119 @@
+# CPython stand-in for umqtt.simple with the same API, so MQTTTransport can be
+# exercised against bin/stub_broker.py. Only what the client and examples use.
+import socket
+import struct
+
+class MQTTException(Exception):
+    pass
+
+class MQTTClient:
+    def __init__(self, client_id, server, port=0, user=None, password=None, keepalive=0):
+        self.client_id = client_id
+        self.server = server
+        self.port = port or 1883
+        self.user = user
+        self.pswd = password
+        self.keepalive = keepalive
+        self.sock = None
+        self.cb = None
+        self.pid = 0
+
+    def _packet(self, first, body):
+        head = bytearray([first])
+        n = len(body)
+        while True:
+            byte = n & 0x7F
+            n >>= 7
+            head.append(byte | 0x80 if n else byte)
+            if not n:
+                return bytes(head) + body
+
+    @staticmethod
+    def _str(s):
+        if isinstance(s, str):
+            s = s.encode()
+        return struct.pack("!H", len(s)) + s
+
+    def _recv(self, n):
+        data = b""
+        while len(data) < n:
+            chunk = self.sock.recv(n - len(data))
+            if not chunk:
+                raise OSError("connection closed by broker")
+            data += chunk
+        return data
+
+    def _read_packet(self):
+        first = self._recv(1)[0]
+        length = shift = 0
+        while True:
+            byte = self._recv(1)[0]
+            length |= (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+        return first, self._recv(length)
+
+    def set_callback(self, f):
+        self.cb = f
+
+    def connect(self, clean_session=True):
+        self.sock = socket.create_connection((self.server, self.port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        flags = 2 if clean_session else 0
+        payload = self._str(self.client_id)
+        if self.user is not None:
+            flags |= 0xC0
+            payload += self._str(self.user) + self._str(self.pswd)
+        body = self._str("MQTT") + struct.pack("!BBH", 4, flags, self.keepalive) + payload
+        self.sock.sendall(self._packet(0x10, body))
+        first, body = self._read_packet()
+        if first != 0x20 or body[1]:
+            raise MQTTException(body[1])
+        return body[0] & 1
+
+    def disconnect(self):
+        self.sock.sendall(b"\xe0\x00")
+        self.sock.close()
+
+    def ping(self):
+        self.sock.sendall(b"\xc0\x00")
+
+    def publish(self, topic, msg, retain=False, qos=0):
+        body = self._str(topic)
+        if qos:
+            self.pid = self.pid % 0xFFFF + 1
+            body += struct.pack("!H", self.pid)
+        self.sock.sendall(self._packet(0x30 | qos << 1 | retain, body + msg))
+        if qos:
+            while True:
+                op = self.wait_msg()
+                if op == 0x40:
+                    return
+
+    def subscribe(self, topic, qos=0):
+        self.pid = self.pid % 0xFFFF + 1
+        self.sock.sendall(self._packet(0x82, struct.pack("!H", self.pid) + self._str(topic) + bytes([qos])))
+        while True:
+            if self.wait_msg() == 0x90:
+                return
+
+    def wait_msg(self):
+        first, body = self._read_packet()
+        if first & 0xF0 == 0x30:
+            n = struct.unpack("!H", body[:2])[0]
+            topic = body[2:2 + n]
+            i = 2 + n + (2 if first & 6 else 0)
+            if self.cb is not None:
+                self.cb(topic, body[i:])
+            return None
+        return first
+
+    def check_msg(self):
+        self.sock.setblocking(False)
+        try:
+            return self.wait_msg()
+        except BlockingIOError:
+            return None
+        finally:
+            self.sock.setblocking(True)
@@ -0,0 +1,2 @@
+# CPython stand-in for MicroPython's urandom
+from random import getrandbits, randint, random, seed, choice
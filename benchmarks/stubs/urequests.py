@@ -0,0 +1,9 @@
+# Offline stand-in for urequests: every POST succeeds without touching the network
+class Response:
+    status_code = 200
+
+    def close(self):
+        pass
+
+def post(url, data=None, headers=None):
+    return Response()
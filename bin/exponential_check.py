@@ -0,0 +1,195 @@
+"""Exponential histogram harness: bucket indexes, float32 rounding and downscaling (CPython).
+
+    python bin/exponential_check.py [--values 2000] [--seed 1]
+
+- index: exponential_index() at every scale from -10 to 20, against indexes
+  worked out with 60-digit decimals. Values are random across the whole
+  float range, plus the floats just either side of bucket boundaries. A
+  value may only land one bucket off, and only if it lies within two ulps of
+  the boundary, as the OTel spec allows for the logarithm method.
+- float32: the same at scales up to MAX_FLOAT32_SCALE, for single-precision
+  values, with math.log and math.pow rounded to float32 and one ulp off, as
+  a port's libm may be.
+- downscale: random values (positive, negative and zero, in random order)
+  go into ExponentialHistogram with several max_size values. The data
+  point's scale must be the finest at which the range fits in max_size
+  buckets, and every bucket count must match the values indexed directly at
+  that scale.
+
+Prints a JSON report and exits non-zero if any check failed.
+"""
+import sys
+import json
+import math
+import random
+import struct
+from decimal import Decimal, getcontext
+
+_here = __file__.rpartition("/")[0] or "."
+sys.path.insert(0, _here + "/..")
+sys.path.append(_here + "/../benchmarks/stubs")
+
+import opentelemetry_metrics
+from opentelemetry_client import OpenTelemetryClient
+from opentelemetry_metrics import (Meter, exponential_index, MAX_EXPONENTIAL_SCALE, MIN_EXPONENTIAL_SCALE,
+                                   MAX_FLOAT32_SCALE)
+
+getcontext().prec = 60
+_LN2 = Decimal(2).ln()
+
+def exact_index(value, scale):
+    # The bucket (base**i, base**(i+1)] holding value, base = 2**(2**-scale). The power of two is
+    # split off exactly, so powers of two aren't pushed across a boundary by rounding.
+    mantissa, exponent = math.frexp(value)
+    x = (exponent - 1 + Decimal(mantissa * 2).ln() / _LN2) * (Decimal(2) ** scale)
+    return int(x.to_integral_value(rounding="ROUND_CEILING")) - 1
+
+def boundary(i, scale):
+    """The float nearest to base**i."""
+    return float((_LN2 * i / (Decimal(2) ** scale)).exp())
+
+def random_values(rng, n):
+    values = [math.ldexp(rng.random() + 0.5, rng.randint(-1070, 1020)) for _ in range(n)]
+    values += [rng.uniform(0.001, 10000) for _ in range(n)]
+    return [v for v in values if v > 0]
+
+def f32(x):
+    return struct.unpack("<f", struct.pack("<f", x))[0]
+
+def f32_ulp(x):
+    bits = struct.unpack("<I", struct.pack("<f", abs(x)))[0]
+    return struct.unpack("<f", struct.pack("<I", bits + 1))[0] - abs(x)
+
+def _compare(values, scales, ulp):
+    # Returns (checked, off by one right at a boundary, other mismatches)
+    checked = 0
+    near_boundary = 0
+    gross = []
+    for scale in scales:
+        for v in values(scale):
+            checked += 1
+            got, want = exponential_index(v, scale), exact_index(v, scale)
+            if got == want:
+                continue
+            if abs(got - want) == 1 and abs(v - boundary(max(got, want), scale)) <= 2 * ulp(v):
+                near_boundary += 1
+            else:
+                gross.append((scale, v, got, want))
+    return {"checked": checked, "off_by_one_at_boundary": near_boundary, "mismatches": len(gross),
+            "first": gross[:5]}
+
+def check_index(rng, n):
+    values = random_values(rng, n)
+
+    def with_boundaries(scale):
+        near = []
+        for v in values[:n // 10]:
+            b = boundary(exact_index(v, scale), scale)
+            near += [math.nextafter(b, 0), b, math.nextafter(b, math.inf)]
+        return values + [v for v in near if 0 < v < math.inf]
+    return _compare(with_boundaries, range(MIN_EXPONENTIAL_SCALE, MAX_EXPONENTIAL_SCALE + 1), math.ulp)
+
+class Float32Math:
+    """math with log and pow as a single-precision libm computes them: rounded, and at worst one ulp off."""
+    def __init__(self, rng):
+        self._rng = rng
+
+    def __getattr__(self, name):
+        return getattr(math, name)
+
+    def _off(self, x):
+        x = f32(x)
+        return f32(x + self._rng.choice((-1, 0, 1)) * f32_ulp(x))
+
+    def log(self, x):
+        return self._off(math.log(f32(x)))
+
+    def pow(self, x, y):
+        return self._off(math.pow(f32(x), f32(y)))
+
+def check_float32(rng, n):
+    values = [f32(v) for v in random_values(rng, n) if 1e-37 < v < 1e38]
+    opentelemetry_metrics.math = Float32Math(rng)
+    try:
+        return _compare(lambda scale: values, range(1, MAX_FLOAT32_SCALE + 1), f32_ulp)
+    finally:
+        opentelemetry_metrics.math = math
+
+def _fits(low, high, size, change):
+    return (high >> change) - (low >> change) < size
+
+def check_downscale(rng, n):
+    client = OpenTelemetryClient(None, "127.0.0.1", sync_time=False)
+    meter = Meter(client)
+    failures = []
+    points = 0
+    for max_size in (3, 4, 20, 160):
+        for spread in (2, 30, 2000):
+            histogram = meter.create_exponential_histogram("check", max_size=max_size)
+            values = [rng.choice((1, 1, -1)) * math.ldexp(rng.random() + 0.5, rng.randint(-spread // 2, spread // 2))
+                      for _ in range(n // 10)]
+            if spread == 2000:
+                # The ends of the float range, which need the minimum scale
+                values += [5e-324, sys.float_info.max, -5e-324]
+            values += [0.0] * 3
+            rng.shuffle(values)
+            for v in values:
+                histogram.record(v)
+            point = histogram._collect(0)["exponentialHistogram"]["dataPoints"][0]
+            points += 1
+            scale = point["scale"]
+            label = "max_size %d, spread 2**%d" % (max_size, spread)
+            if point["count"] != len(values) or point["zeroCount"] != 3:
+                failures.append("%s: count %d, zeroCount %d" % (label, point["count"], point["zeroCount"]))
+            if point["min"] != min(values) or point["max"] != max(values):
+                failures.append("%s: min/max %r %r" % (label, point["min"], point["max"]))
+            for sign, name in ((1, "positive"), (-1, "negative")):
+                expected = {}
+                for v in values:
+                    if v * sign > 0:
+                        index = exponential_index(abs(v), scale)
+                        expected[index] = expected.get(index, 0) + 1
+                buckets = point.get(name, {"offset": 0, "bucketCounts": []})
+                got = {buckets["offset"] + i: c for i, c in enumerate(buckets["bucketCounts"]) if c}
+                if got != expected:
+                    failures.append("%s: %s buckets at scale %d differ" % (label, name, scale))
+                if len(buckets["bucketCounts"]) > max_size:
+                    failures.append("%s: %d %s buckets" % (label, len(buckets["bucketCounts"]), name))
+            # The finest scale at which each sign's range fits; both signs share it
+            finest = MAX_EXPONENTIAL_SCALE
+            for sign in (1, -1):
+                side = [exponential_index(abs(v), MAX_EXPONENTIAL_SCALE) for v in values if v * sign > 0]
+                if side:
+                    change = 0
+                    while not _fits(min(side), max(side), max_size, change):
+                        change += 1
+                    finest = min(finest, MAX_EXPONENTIAL_SCALE - change)
+            finest = max(finest, MIN_EXPONENTIAL_SCALE)
+            if scale != finest:
+                failures.append("%s: scale %d, the range fits at %d" % (label, scale, finest))
+    return {"points": points, "failures": len(failures), "first": failures[:5]}
+
+def main(argv):
+    options = {"--values": "2000", "--seed": "1"}
+    i = 0
+    while i < len(argv):
+        if argv[i] in options and i + 1 < len(argv):
+            i += 1
+            options[argv[i - 1]] = argv[i]
+        else:
+            print(__doc__)
+            return 2
+        i += 1
+    n = int(options["--values"])
+    rng = random.Random(int(options["--seed"]))
+    report = {
+        "index": check_index(rng, n),
+        "float32": check_float32(rng, n),
+        "downscale": check_downscale(rng, n),
+    }
+    print(json.dumps(report, indent=2))
+    failed = report["index"]["mismatches"] + report["float32"]["mismatches"] + report["downscale"]["failures"]
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,145 @@
+"""End-to-end load harness: drives OpenTelemetryClient against a collector (CPython).
+
+    python bin/load_test.py [--rate 200] [--duration 10] [--wire-format json|protobuf]
+                            [--compression gzip|deflate] [--streaming] [--logs-per-span 1]
+                            [--collector HOST:PORT] [--fail-every N] [--delay-ms MS] [--mqtt]
+
+Without --collector, an in-process bin/stub_collector.py is started on a
+free port, and --fail-every/--delay-ms make it answer every Nth request with
+503 or answer slowly. Every iteration starts and ends a span, emits logs
+tied to it and adds to a counter. At the end the client is flushed and the
+collector's /stats are compared with what was generated. The report covers
+throughput, recording and export latency, delivery delay and loss. With
+--mqtt the exports are published through MQTTTransport to an in-process
+bin/stub_broker.py instead, and its counters are compared.
+"""
+import sys
+import json
+import time
+import urllib.request
+
+_here = __file__.rpartition("/")[0] or "."
+sys.path.insert(0, _here)
+sys.path.insert(0, _here + "/..")
+sys.path.append(_here + "/../benchmarks/stubs")
+
+from opentelemetry_client import OpenTelemetryClient
+from opentelemetry_metrics import Meter
+from opentelemetry_transport import MQTTTransport
+from stub_collector import StubCollector
+from stub_broker import StubBroker
+
+def _percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, len(values) * p // 100)]
+
+def _collector_stats(base_url, method="GET"):
+    request = urllib.request.Request(base_url + "/stats", method=method)
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+def run(host, port, rate, duration, logs_per_span, client_options, broker=None):
+    if broker is None:
+        base_url = "http://%s:%d" % (host, port)
+        _collector_stats(base_url, "DELETE")
+    otel = OpenTelemetryClient(None, host, port, resource_attributes={"service.name": "load-test"},
+                               sync_time=False, self_telemetry=True, **client_options)
+    counter = Meter(otel, export_interval_ms=1000).create_counter("load.iterations")
+    record_us = []
+    interval = 1.0 / rate
+    started = time.perf_counter()
+    next_at = started
+    iterations = 0
+    while time.perf_counter() - started < duration:
+        t0 = time.perf_counter()
+        trace_id, span_id = otel.start_trace("load_iteration", kind="INTERNAL", attributes={"iteration": iterations})
+        for _ in range(logs_per_span):
+            otel.log(trace_id, span_id, "load log", {"iteration": iterations})
+        counter.add(1)
+        otel.end_trace(span_id)
+        otel.poll()
+        record_us.append((time.perf_counter() - t0) * 1e6)
+        iterations += 1
+        next_at += interval
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    elapsed = time.perf_counter() - started
+    otel.shutdown()
+    # Let the collector finish the last requests before reading its counters
+    time.sleep(0.2)
+    received = _collector_stats(base_url) if broker is None else broker.snapshot()
+    client = otel.stats()
+    sampled = client["spans_created"]
+    logs = iterations * logs_per_span
+    latency = client["export_latency_us"]
+    return {
+        "iterations": iterations,
+        "elapsed_s": round(elapsed, 3),
+        "achieved_rate": round(iterations / elapsed, 1),
+        "record_us": {"p50": _percentile(record_us, 50), "p99": _percentile(record_us, 99), "max": max(record_us)},
+        "export_requests": client["export_attempts"],
+        "export_failures": client["export_failures"],
+        "export_latency_ms_avg": round(latency["sum"] / latency["count"] / 1000, 2) if latency["count"] else None,
+        "bytes_sent": client["bytes_sent"],
+        "spans": {"generated": sampled, "received": received["spans"], "lost": sampled - received["spans"]},
+        "logs": {"generated": logs, "received": received["logs"], "lost": logs - received["logs"]},
+        "points_received": received["points"],
+        "delivery_delay_ms": received["span_delay_ms"],
+        "collector_rejected": received["rejected"],
+        "collector_errors": received["errors"],
+    }
+
+def main(argv):
+    options = {
+        "--rate": "200", "--duration": "10", "--wire-format": "json", "--compression": None,
+        "--logs-per-span": "1", "--collector": None, "--fail-every": "0", "--delay-ms": "0",
+    }
+    streaming = False
+    mqtt = False
+    i = 0
+    while i < len(argv):
+        if argv[i] == "--streaming":
+            streaming = True
+        elif argv[i] == "--mqtt":
+            mqtt = True
+        elif argv[i] in options and i + 1 < len(argv):
+            i += 1
+            options[argv[i - 1]] = argv[i]
+        else:
+            print(__doc__)
+            return 2
+        i += 1
+    server = None
+    client_options = {
+        "wire_format": options["--wire-format"],
+        "compression": options["--compression"],
+        "streaming": streaming,
+    }
+    if mqtt:
+        from umqtt.simple import MQTTClient
+        server = StubBroker("127.0.0.1", 0)
+        session = MQTTClient("load-test", "127.0.0.1", server.start())
+        session.connect()
+        client_options["transport"] = MQTTTransport(session)
+        host, port = None, None
+    elif options["--collector"]:
+        host, _, port = options["--collector"].partition(":")
+        port = int(port or 4318)
+    else:
+        server = StubCollector("127.0.0.1", 0, int(options["--fail-every"]), float(options["--delay-ms"]))
+        host, port = "127.0.0.1", server.start()
+    try:
+        report = run(host, port, float(options["--rate"]), float(options["--duration"]), int(options["--logs-per-span"]),
+                     client_options, server if mqtt else None)
+    finally:
+        if server is not None:
+            server.stop()
+    print(json.dumps(report, indent=2))
+    lost = report["spans"]["lost"] + report["logs"]["lost"]
+    return 1 if lost or report["collector_rejected"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,209 @@
+"""PersistentQueue harness: eviction, oversized exports and replay after a restart (CPython).
+
+    python bin/queue_check.py [--max-bytes 3000] [--segment-bytes 1000]
+
+Every check runs on its own temporary directory:
+
+- wrap: more requests than fit, so the oldest segments are evicted. Every
+  request must come back exactly once, through `on_evict` or `replay`, in
+  order, and the segment files must add up to `size`.
+- oversize: a request larger than the whole queue is refused and leaves it
+  unchanged; one larger than a segment gets a segment of its own.
+- restart: the queue is opened again on the same directory, as after a
+  reboot, partway through a replay. Nothing is lost, and only the partly
+  replayed segment is sent again.
+- torn: the last record is cut short, as by a power cut mid-write. The
+  requests before it still replay.
+- client: an OpenTelemetryClient queues spans while an in-process
+  bin/stub_collector.py answers 503. A second client on the same directory
+  delivers them once the collector is back.
+
+Prints a JSON report and exits non-zero if any check failed.
+"""
+import os
+import sys
+import json
+import tempfile
+import urllib.request
+
+_here = __file__.rpartition("/")[0] or "."
+sys.path.insert(0, _here)
+sys.path.insert(0, _here + "/..")
+sys.path.append(_here + "/../benchmarks/stubs")
+
+from opentelemetry_client import OpenTelemetryClient
+from opentelemetry_queue import PersistentQueue
+from stub_collector import StubCollector
+
+HEADERS = {"Content-Type": "application/x-protobuf", "Content-Encoding": "gzip"}
+
+def _put(queue, seq, size=100):
+    # The sequence number leads the body and doubles as the record count
+    body = (b"%06d" % seq).ljust(size, b".")
+    return queue.put("/v1/logs", body, HEADERS, seq)
+
+def _replay(queue, stop_after=None):
+    seen = []
+
+    def send(path, body, headers, count):
+        if stop_after is not None and len(seen) == stop_after:
+            return False
+        seq = int(body[:6])
+        if path != "/v1/logs" or headers != HEADERS or count != seq:
+            raise AssertionError("request %d came back as %r %r %r" % (seq, path, headers, count))
+        seen.append(seq)
+        return True
+    consumed = queue.replay(send)
+    if consumed != len(seen):
+        raise AssertionError("replay returned %d, sent %d" % (consumed, len(seen)))
+    return seen
+
+def _disk_bytes(directory):
+    return sum(os.stat(directory + "/" + name)[6] for name in os.listdir(directory))
+
+def check_wrap(directory, max_bytes, segment_bytes):
+    queue = PersistentQueue(directory, max_bytes, segment_bytes)
+    evicted = []
+    queue.on_evict = lambda path, count: evicted.append(count)
+    total = 4 * max_bytes // 100
+    for seq in range(1, total + 1):
+        if not _put(queue, seq):
+            raise AssertionError("request %d refused" % seq)
+        if queue.size > max_bytes or _disk_bytes(directory) != queue.size:
+            raise AssertionError("size %d, %d on disk, limit %d" % (queue.size, _disk_bytes(directory), max_bytes))
+    if not queue.evicted_segments:
+        raise AssertionError("nothing was evicted")
+    replayed = _replay(queue)
+    if evicted + replayed != list(range(1, total + 1)):
+        raise AssertionError("evicted %r then replayed %r" % (evicted, replayed))
+    if queue.size or os.listdir(directory):
+        raise AssertionError("%d bytes left after replay" % queue.size)
+    _put(queue, 1)
+    if os.listdir(directory) != ["00000001.seg"]:
+        raise AssertionError("numbering did not restart: %r" % os.listdir(directory))
+    return {"requests": total, "evicted_segments": queue.evicted_segments, "evicted": len(evicted),
+            "replayed": len(replayed)}
+
+def check_oversize(directory, max_bytes, segment_bytes):
+    queue = PersistentQueue(directory, max_bytes, segment_bytes)
+    _put(queue, 1)
+    size = queue.size
+    if _put(queue, 2, max_bytes) or queue.size != size or _disk_bytes(directory) != size:
+        raise AssertionError("a request larger than the queue was stored")
+    if not _put(queue, 3, segment_bytes + 1):
+        raise AssertionError("a request larger than a segment was refused")
+    _put(queue, 4)
+    if len(os.listdir(directory)) != 3:
+        raise AssertionError("expected a segment of its own, got %r" % sorted(os.listdir(directory)))
+    replayed = _replay(queue)
+    if replayed != [1, 3, 4]:
+        raise AssertionError("replayed %r" % replayed)
+    return {"refused_bytes": max_bytes, "own_segment_bytes": segment_bytes + 1}
+
+def check_restart(directory, max_bytes, segment_bytes):
+    queue = PersistentQueue(directory, max_bytes, segment_bytes)
+    _put(queue, 1)
+    record = queue.size
+    # Well short of eviction; records grow a little as the count gets more digits
+    total = max_bytes * 3 // 4 // record
+    for seq in range(2, total + 1):
+        _put(queue, seq)
+    queue = PersistentQueue(directory, max_bytes, segment_bytes)
+    before = _replay(queue, total // 2)
+    # Reboot in the middle of a segment; the replay position was only in RAM
+    queue = PersistentQueue(directory, max_bytes, segment_bytes)
+    after = _replay(queue)
+    if before != list(range(1, total // 2 + 1)) or not after or after[-1] != total:
+        raise AssertionError("replayed %r, then %r after the restart" % (before, after))
+    if after != list(range(after[0], total + 1)) or after[0] > before[-1] + 1:
+        raise AssertionError("lost requests across the restart: %r then %r" % (before, after))
+    if before[-1] - after[0] + 1 > max(segment_bytes // record, 1):
+        raise AssertionError("more than one segment was sent again: %r" % after)
+    return {"requests": total, "before_restart": len(before), "sent_again": before[-1] - after[0] + 1}
+
+def check_torn(directory, max_bytes, segment_bytes):
+    queue = PersistentQueue(directory, max_bytes, segment_bytes)
+    for seq in range(1, 6):
+        _put(queue, seq)
+    name = directory + "/" + sorted(os.listdir(directory))[-1]
+    with open(name, "rb") as f:
+        data = f.read()
+    with open(name, "wb") as f:
+        f.write(data[:-3])
+    queue = PersistentQueue(directory, max_bytes, segment_bytes)
+    replayed = _replay(queue)
+    if replayed != [1, 2, 3, 4] or queue.size:
+        raise AssertionError("replayed %r, %d bytes left" % (replayed, queue.size))
+    return {"replayed": len(replayed)}
+
+def _collector_spans(port):
+    with urllib.request.urlopen("http://127.0.0.1:%d/stats" % port) as response:
+        return json.loads(response.read())["spans"]
+
+def check_client(directory, max_bytes, segment_bytes):
+    spans = 10
+    down = StubCollector("127.0.0.1", 0, fail_every=1)
+    port = down.start()
+    otel = OpenTelemetryClient(None, "127.0.0.1", port, sync_time=False,
+                               persistent_queue=PersistentQueue(directory, max_bytes * 4, segment_bytes))
+    for i in range(spans):
+        trace_id, span_id = otel.start_trace("offline", kind="INTERNAL", attributes={"i": i})
+        otel.end_trace(span_id)
+        otel.flush()
+    down.stop()
+    queued = otel.persistent_queue.size
+    if not queued:
+        raise AssertionError("nothing was queued while the collector was down")
+    up = StubCollector("127.0.0.1", 0)
+    port = up.start()
+    otel = OpenTelemetryClient(None, "127.0.0.1", port, sync_time=False, self_telemetry=True,
+                               persistent_queue=PersistentQueue(directory, max_bytes * 4, segment_bytes))
+    trace_id, span_id = otel.start_trace("online", kind="INTERNAL")
+    otel.end_trace(span_id)
+    otel.flush()
+    received = _collector_spans(port)
+    up.stop()
+    if received != spans + 1 or otel.persistent_queue.size:
+        raise AssertionError("collector received %d of %d spans, %d bytes still queued" % (
+            received, spans + 1, otel.persistent_queue.size))
+    return {"queued_bytes": queued, "received": received, "spans_exported": otel.stats()["spans_exported"]}
+
+CHECKS = (
+    ("wrap", check_wrap),
+    ("oversize", check_oversize),
+    ("restart", check_restart),
+    ("torn", check_torn),
+    ("client", check_client),
+)
+
+def main(argv):
+    options = {"--max-bytes": "3000", "--segment-bytes": "1000"}
+    i = 0
+    while i < len(argv):
+        if argv[i] in options and i + 1 < len(argv):
+            i += 1
+            options[argv[i - 1]] = argv[i]
+        else:
+            print(__doc__)
+            return 2
+        i += 1
+    max_bytes = int(options["--max-bytes"])
+    segment_bytes = int(options["--segment-bytes"])
+    if 2 * segment_bytes > max_bytes:
+        # Eviction and the oversized segment need room for at least two segments
+        print("--segment-bytes must be at most half of --max-bytes")
+        return 2
+    report = {}
+    failed = 0
+    for name, check in CHECKS:
+        with tempfile.TemporaryDirectory() as tmp:
+            try:
+                report[name] = check(tmp + "/queue", max_bytes, segment_bytes)
+            except AssertionError as e:
+                report[name] = {"error": str(e)}
+                failed += 1
+    print(json.dumps(report, indent=2))
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,126 @@
+"""Deep-sleep cycle harness: wake, record, prepare_for_sleep(), sleep, repeat (CPython).
+
+    python bin/sleep_cycle.py [--cycles 10] [--spans 5] [--fail-every N] [--deadline-ms MS]
+                              [--wire-format protobuf|json] [--file]
+
+Each wake runs in a fresh process, like a device coming out of deep sleep,
+with the stub `machine` module from benchmarks/stubs. RTC memory is kept in a
+temporary file, or with --file a FileStore is used instead. Every wake starts
+OpenTelemetryClient with sync_time=True, records spans, logs and an
+observable gauge, and calls prepare_for_sleep(). An in-process
+bin/stub_collector.py receives the exports. With --fail-every it answers
+every Nth request per signal with 503, and those requests must come through
+on a later wake. Extra wakes that record nothing run until the store is
+empty. The report shows how many NTP rounds ran and how much was saved,
+resumed and received. It exits non-zero if anything was lost other than
+requests the store had no room for. RTC memory holds 2048 bytes, which is
+why protobuf is the default here.
+"""
+import os
+import sys
+import json
+import tempfile
+import subprocess
+import urllib.request
+
+_here = __file__.rpartition("/")[0] or "."
+
+def wake(port, spans, deadline_ms, store_path, use_file, wire_format):
+    sys.path.insert(0, _here + "/..")
+    sys.path.append(_here + "/../benchmarks/stubs")
+    import machine
+    import ntptime
+    import opentelemetry_client
+    from opentelemetry_client import OpenTelemetryClient
+    from opentelemetry_metrics import Meter
+    from opentelemetry_sleep import RTCMemoryStore, FileStore
+
+    ntp_rounds = [0]
+    settime = ntptime.settime
+
+    def counting_settime():
+        ntp_rounds[0] += 1
+        settime()
+    ntptime.settime = counting_settime
+    opentelemetry_client.print = lambda *args, **kwargs: None
+    store = FileStore(store_path) if use_file else RTCMemoryStore()
+    otel = OpenTelemetryClient(None, "127.0.0.1", port, resource_attributes={"service.name": "sleep-cycle"},
+                               sync_time=True, sleep_store=store, wire_format=wire_format)
+    resumed = len(otel._retry_requests)
+    Meter(otel).create_observable_gauge("battery.voltage", lambda: 3.7, "V")
+    for i in range(spans):
+        trace_id, span_id = otel.start_trace("measure", kind="INTERNAL", attributes={"i": i})
+        otel.log(trace_id, span_id, "measured")
+        otel.end_trace(span_id)
+    saved = otel.prepare_for_sleep(sleep_ms=1000, deadline_ms=deadline_ms)
+    print(json.dumps({"ntp": ntp_rounds[0], "resumed": resumed, "saved": saved, "dropped": store.dropped}))
+    sys.stdout.flush()
+    machine.deepsleep(1000)
+
+def _collector_stats(base_url):
+    with urllib.request.urlopen(base_url + "/stats") as response:
+        return json.loads(response.read())
+
+def main(argv):
+    options = {"--cycles": "10", "--spans": "5", "--fail-every": "0", "--deadline-ms": "3000",
+               "--wire-format": "protobuf", "--wake": None, "--store": None}
+    use_file = False
+    i = 0
+    while i < len(argv):
+        if argv[i] == "--file":
+            use_file = True
+        elif argv[i] in options and i + 1 < len(argv):
+            i += 1
+            options[argv[i - 1]] = argv[i]
+        else:
+            print(__doc__)
+            return 2
+        i += 1
+    spans = int(options["--spans"])
+    if options["--wake"] is not None:
+        return wake(int(options["--wake"]), spans, int(options["--deadline-ms"]), options["--store"], use_file,
+                    options["--wire-format"])
+
+    sys.path.insert(0, _here)
+    from stub_collector import StubCollector
+    server = StubCollector("127.0.0.1", 0, int(options["--fail-every"]))
+    port = server.start()
+    cycles = int(options["--cycles"])
+    wakes = []
+    with tempfile.TemporaryDirectory() as tmp:
+        store_path = tmp + "/otel_sleep.bin"
+        env = dict(os.environ, MACHINE_RTC_MEMORY=tmp + "/rtc_memory")
+        cycle = 0
+        # After the recording wakes, keep waking without recording until nothing is left to deliver
+        while cycle < cycles or (wakes[-1]["saved"] and cycle < 2 * cycles + 10):
+            args = [sys.executable, __file__, "--wake", str(port), "--spans", str(spans if cycle < cycles else 0),
+                    "--deadline-ms", options["--deadline-ms"], "--wire-format", options["--wire-format"],
+                    "--store", store_path]
+            if use_file:
+                args.append("--file")
+            output = subprocess.run(args, env=env, capture_output=True, text=True, check=True).stdout
+            wakes.append(json.loads(output.strip().splitlines()[-1]))
+            cycle += 1
+    received = _collector_stats("http://127.0.0.1:%d" % port)
+    server.stop()
+    generated = cycles * spans
+    report = {
+        "wakes": len(wakes),
+        "ntp_rounds": sum(w["ntp"] for w in wakes),
+        "requests_saved": sum(w["saved"] for w in wakes),
+        "requests_resumed": sum(w["resumed"] for w in wakes),
+        "requests_dropped_for_space": sum(w["dropped"] for w in wakes),
+        "requests_failed_on_purpose": received["failed_on_purpose"],
+        "spans": {"generated": generated, "received": received["spans"], "lost": generated - received["spans"]},
+        "logs": {"generated": generated, "received": received["logs"], "lost": generated - received["logs"]},
+        "points_received": received["points"],
+        "collector_rejected": received["rejected"],
+    }
+    print(json.dumps(report, indent=2))
+    lost = report["spans"]["lost"] + report["logs"]["lost"]
+    if lost and not report["requests_dropped_for_space"]:
+        return 1
+    return 1 if report["collector_rejected"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
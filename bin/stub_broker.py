@@ -0,0 +1,215 @@
+"""Fake MQTT broker for testing MQTTTransport exports (CPython).
+
+    python bin/stub_broker.py [--host 127.0.0.1] [--port 1883] [--prefix otlp] [--forward HOST:PORT]
+
+Speaks enough MQTT 3.1.1 for umqtt.simple: CONNECT, PUBLISH at QoS 0 and 1,
+SUBSCRIBE, PINGREQ and DISCONNECT. Messages are delivered to matching
+subscribers as usual. Messages on `<prefix>/v1/<signal>/<json|protobuf>[/gzip|/deflate]`
+are also decoded and checked like bin/stub_collector.py does, and the
+counters are printed on exit. With --forward every OTLP message is POSTed
+on to a collector, which is the bridge a gateway would run.
+"""
+import sys
+import json
+import time
+import socketserver
+import threading
+import urllib.request
+
+_here = __file__.rpartition("/")[0] or "."
+sys.path.insert(0, _here)
+
+from stub_collector import SIGNALS, Stats, ingest
+
+CONTENT_TYPES = {"json": "application/json", "protobuf": "application/x-protobuf"}
+
+CONNECT, PUBLISH, SUBSCRIBE, PINGREQ, DISCONNECT = 1, 3, 8, 12, 14
+
+def topic_matches(pattern, topic):
+    pattern = pattern.split("/")
+    topic = topic.split("/")
+    for i, level in enumerate(pattern):
+        if level == "#":
+            return True
+        if i >= len(topic) or level not in ("+", topic[i]):
+            return False
+    return len(pattern) == len(topic)
+
+def parse_otlp_topic(prefix, topic):
+    """Return (path, Content-Type, Content-Encoding) for an OTLP export topic, or None."""
+    if not topic.startswith(prefix + "/v1/"):
+        return None
+    levels = topic[len(prefix):].split("/")
+    # ["", "v1", signal, format] plus an optional encoding
+    if len(levels) not in (4, 5) or levels[3] not in CONTENT_TYPES:
+        return None
+    path = "/v1/" + levels[2]
+    if path not in SIGNALS:
+        return None
+    return path, CONTENT_TYPES[levels[3]], levels[4] if len(levels) == 5 else ""
+
+def packet(kind, flags, body):
+    head = bytearray([kind << 4 | flags])
+    n = len(body)
+    while True:
+        byte = n & 0x7F
+        n >>= 7
+        head.append(byte | 0x80 if n else byte)
+        if not n:
+            return bytes(head) + body
+
+class Handler(socketserver.StreamRequestHandler):
+    def _read_packet(self):
+        first = self.rfile.read(1)
+        if not first:
+            return None, None, None
+        length = shift = 0
+        while True:
+            byte = self.rfile.read(1)[0]
+            length |= (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+        return first[0] >> 4, first[0] & 0x0F, self.rfile.read(length)
+
+    def send(self, data):
+        with self.lock:
+            self.wfile.write(data)
+
+    def handle(self):
+        server = self.server
+        self.lock = threading.Lock()
+        self.subscriptions = []
+        try:
+            while True:
+                kind, flags, body = self._read_packet()
+                if kind is None or kind == DISCONNECT:
+                    break
+                if kind == CONNECT:
+                    self.send(b"\x20\x02\x00\x00")
+                elif kind == PUBLISH:
+                    self._publish(flags, body)
+                elif kind == SUBSCRIBE:
+                    granted = bytearray()
+                    i = 2
+                    while i < len(body):
+                        n = int.from_bytes(body[i:i + 2], "big")
+                        self.subscriptions.append(body[i + 2:i + 2 + n].decode())
+                        i += n + 3
+                        granted.append(0)
+                    with server.lock:
+                        server.sessions.append(self)
+                    self.send(packet(9, 0, body[:2] + bytes(granted)))
+                elif kind == PINGREQ:
+                    self.send(b"\xd0\x00")
+        except (OSError, IndexError):
+            pass
+        finally:
+            with server.lock:
+                if self in server.sessions:
+                    server.sessions.remove(self)
+
+    def _publish(self, flags, body):
+        received_ns = time.time_ns()
+        server = self.server
+        qos = flags >> 1 & 3
+        n = int.from_bytes(body[:2], "big")
+        topic = body[2:2 + n].decode()
+        i = 2 + n
+        if qos:
+            packet_id = body[i:i + 2]
+            i += 2
+        payload = body[i:]
+        with server.lock:
+            server.messages += 1
+            sessions = list(server.sessions)
+        route = parse_otlp_topic(server.prefix, topic)
+        if route is not None:
+            path, content_type, encoding = route
+            stats = server.stats
+            with stats.lock:
+                stats.requests[SIGNALS[path]] += 1
+                stats.wire_bytes[SIGNALS[path]] += len(payload)
+            error = ingest(stats, path, content_type, encoding, payload, received_ns)
+            if error is not None and server.verbose:
+                print("❌", topic, error)
+            if server.forward:
+                server.bridge(path, content_type, encoding, payload)
+        if qos:
+            self.send(b"\x40\x02" + packet_id)
+        # Deliver at QoS 0 to everyone subscribed, like a real broker would
+        message = packet(PUBLISH, 0, body[:2 + n] + payload)
+        for session in sessions:
+            if any(topic_matches(pattern, topic) for pattern in session.subscriptions):
+                try:
+                    session.send(message)
+                except OSError:
+                    pass
+
+class StubBroker(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=1883, prefix="otlp", forward=None, verbose=False):
+        super().__init__((host, port), Handler)
+        self.prefix = prefix.rstrip("/")
+        self.forward = forward
+        self.verbose = verbose
+        self.stats = Stats()
+        self.lock = threading.Lock()
+        self.sessions = []
+        self.messages = 0
+        self._thread = None
+
+    def bridge(self, path, content_type, encoding, payload):
+        headers = {"Content-Type": content_type}
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        request = urllib.request.Request("http://%s%s" % (self.forward, path), payload, headers)
+        try:
+            urllib.request.urlopen(request).close()
+        except OSError as e:
+            print("❌ Forwarding", path, "failed:", e)
+
+    def snapshot(self):
+        snapshot = self.stats.snapshot()
+        snapshot["messages"] = self.messages
+        return snapshot
+
+    def start(self):
+        """Serve from a background thread; returns the bound port."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self.server_address[1]
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+def main(argv):
+    options = {"--host": "127.0.0.1", "--port": "1883", "--prefix": "otlp", "--forward": None}
+    verbose = False
+    i = 0
+    while i < len(argv):
+        if argv[i] == "--verbose":
+            verbose = True
+        elif argv[i] in options and i + 1 < len(argv):
+            i += 1
+            options[argv[i - 1]] = argv[i]
+        else:
+            print(__doc__)
+            return 2
+        i += 1
+    server = StubBroker(options["--host"], int(options["--port"]), options["--prefix"], options["--forward"], verbose)
+    print("Stub broker listening on %s:%d, OTLP topics under %s/" % (
+        server.server_address[0], server.server_address[1], server.prefix))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(server.snapshot(), indent=2))
+    server.server_close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
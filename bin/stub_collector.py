@@ -0,0 +1,444 @@
+"""Stub OTLP/HTTP collector for local testing (CPython).
+
+    python bin/stub_collector.py [--host 127.0.0.1] [--port 4318] [--fail-every N] [--delay-ms MS]
+
+Accepts POST /v1/traces, /v1/metrics and /v1/logs as OTLP/JSON, and as
+protobuf when the `opentelemetry-proto` package is installed. Request
+bodies may be chunked and gzip/deflate encoded. Every payload is checked
+against the OTLP schema, and invalid ones get a 400 response with the first
+problem found. GET /stats returns the counters as JSON: requests and bytes
+per signal, spans/logs/points received, rejected requests, and how long
+spans took from ending on the device to reaching the collector.
+"""
+import sys
+import json
+import time
+import zlib
+import base64
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    from opentelemetry.proto.collector.trace.v1.trace_service_pb2 import ExportTraceServiceRequest
+    from opentelemetry.proto.collector.metrics.v1.metrics_service_pb2 import ExportMetricsServiceRequest
+    from opentelemetry.proto.collector.logs.v1.logs_service_pb2 import ExportLogsServiceRequest
+    from google.protobuf.json_format import MessageToDict
+    PROTOBUF_REQUESTS = {
+        "/v1/traces": ExportTraceServiceRequest,
+        "/v1/metrics": ExportMetricsServiceRequest,
+        "/v1/logs": ExportLogsServiceRequest,
+    }
+except ImportError:
+    PROTOBUF_REQUESTS = None
+
+SIGNALS = {"/v1/traces": "traces", "/v1/metrics": "metrics", "/v1/logs": "logs"}
+
+class SchemaError(ValueError):
+    pass
+
+def _hex_id(value):
+    return value
+
+def _base64_id(value):
+    # MessageToDict renders bytes fields as base64
+    return base64.b64decode(value).hex()
+
+class Validator:
+    """Walks one decoded export request and checks it against the OTLP schema."""
+    def __init__(self, decode_id=_hex_id):
+        self.decode_id = decode_id
+        self.records = 0
+        self.span_end_times = []
+
+    def fail(self, path, message):
+        raise SchemaError("%s: %s" % (path, message))
+
+    def list_of(self, obj, key, path, required=True):
+        value = obj.get(key)
+        if value is None:
+            if required:
+                self.fail(path, "missing %s" % key)
+            return []
+        if not isinstance(value, list):
+            self.fail(path, "%s must be a list" % key)
+        return value
+
+    def uint64(self, obj, key, path, required=True):
+        # proto3 JSON allows 64-bit integers as numbers or decimal strings
+        value = obj.get(key)
+        if value is None:
+            if required:
+                self.fail(path, "missing %s" % key)
+            return 0
+        if isinstance(value, str) and value.isdigit():
+            return int(value)
+        if isinstance(value, int) and not isinstance(value, bool) and value >= 0:
+            return value
+        self.fail(path, "%s must be an unsigned integer, got %r" % (key, value))
+
+    def id(self, obj, key, size, path, required=True):
+        value = obj.get(key)
+        if not value:
+            if required:
+                self.fail(path, "missing %s" % key)
+            return None
+        try:
+            decoded = self.decode_id(value)
+            int(decoded, 16)
+        except (ValueError, TypeError):
+            self.fail(path, "%s is not a valid ID: %r" % (key, value))
+        if len(decoded) != 2 * size:
+            self.fail(path, "%s must be %d bytes, got %r" % (key, size, value))
+        if decoded.lower() != decoded:
+            self.fail(path, "%s must be lowercase hex" % key)
+        if int(decoded, 16) == 0:
+            self.fail(path, "%s must not be all zeros" % key)
+        return decoded
+
+    def any_value(self, value, path):
+        if not isinstance(value, dict) or len(value) != 1:
+            self.fail(path, "AnyValue must have exactly one field, got %r" % (value,))
+        kind, inner = next(iter(value.items()))
+        if kind == "stringValue":
+            ok = isinstance(inner, str)
+        elif kind == "boolValue":
+            ok = isinstance(inner, bool)
+        elif kind == "intValue":
+            ok = (isinstance(inner, int) and not isinstance(inner, bool)) or (
+                isinstance(inner, str) and inner.lstrip("-").isdigit())
+        elif kind == "doubleValue":
+            ok = isinstance(inner, (int, float)) and not isinstance(inner, bool)
+        elif kind == "bytesValue":
+            ok = isinstance(inner, str)
+        elif kind == "arrayValue":
+            for i, item in enumerate(self.list_of(inner, "values", path, False)):
+                self.any_value(item, "%s.values[%d]" % (path, i))
+            ok = True
+        elif kind == "kvlistValue":
+            self.attributes(inner, "values", path)
+            ok = True
+        else:
+            ok = False
+        if not ok:
+            self.fail(path, "invalid %s %r" % (kind, inner))
+
+    def attributes(self, obj, key, path):
+        seen = set()
+        for i, attribute in enumerate(self.list_of(obj, key, path, False)):
+            item_path = "%s.%s[%d]" % (path, key, i)
+            name = attribute.get("key") if isinstance(attribute, dict) else None
+            if not isinstance(name, str) or not name:
+                self.fail(item_path, "attribute without a key")
+            if name in seen:
+                self.fail(item_path, "duplicate attribute %r" % name)
+            seen.add(name)
+            self.any_value(attribute.get("value"), item_path + ".value")
+
+    def envelope(self, request, resource_key, scope_key, records_key, record):
+        for i, resource_item in enumerate(self.list_of(request, resource_key, "")):
+            path = "%s[%d]" % (resource_key, i)
+            self.attributes(resource_item.get("resource") or {}, "attributes", path + ".resource")
+            for j, scope_item in enumerate(self.list_of(resource_item, scope_key, path)):
+                scope_path = "%s.%s[%d]" % (path, scope_key, j)
+                scope = scope_item.get("scope") or {}
+                if "name" in scope and not isinstance(scope["name"], str):
+                    self.fail(scope_path, "scope name must be a string")
+                for k, item in enumerate(self.list_of(scope_item, records_key, scope_path)):
+                    record(item, "%s.%s[%d]" % (scope_path, records_key, k))
+                    self.records += 1
+
+    def span(self, span, path):
+        self.id(span, "traceId", 16, path)
+        self.id(span, "spanId", 8, path)
+        self.id(span, "parentSpanId", 8, path, required=False)
+        if not isinstance(span.get("name"), str) or not span["name"]:
+            self.fail(path, "span needs a name")
+        if span.get("kind", 0) not in (0, 1, 2, 3, 4, 5):
+            self.fail(path, "invalid kind %r" % span.get("kind"))
+        start = self.uint64(span, "startTimeUnixNano", path)
+        end = self.uint64(span, "endTimeUnixNano", path)
+        if end < start:
+            self.fail(path, "span ends before it starts")
+        self.attributes(span, "attributes", path)
+        for i, event in enumerate(self.list_of(span, "events", path, False)):
+            event_path = "%s.events[%d]" % (path, i)
+            self.uint64(event, "timeUnixNano", event_path)
+            if not isinstance(event.get("name"), str):
+                self.fail(event_path, "event needs a name")
+            self.attributes(event, "attributes", event_path)
+        status = span.get("status")
+        if status is not None and status.get("code", 0) not in (0, 1, 2):
+            self.fail(path, "invalid status code %r" % status.get("code"))
+        self.span_end_times.append(end)
+
+    def log_record(self, record, path):
+        self.uint64(record, "timeUnixNano", path, required=False)
+        self.uint64(record, "observedTimeUnixNano", path, required=False)
+        if "body" in record:
+            self.any_value(record["body"], path + ".body")
+        self.attributes(record, "attributes", path)
+        self.id(record, "traceId", 16, path, required=False)
+        self.id(record, "spanId", 8, path, required=False)
+        severity = record.get("severityNumber", 0)
+        if not isinstance(severity, int) or not 0 <= severity <= 24:
+            self.fail(path, "invalid severityNumber %r" % severity)
+
+    def _points(self, data, path):
+        points = self.list_of(data, "dataPoints", path)
+        for i, point in enumerate(points):
+            point_path = "%s.dataPoints[%d]" % (path, i)
+            self.uint64(point, "timeUnixNano", point_path)
+            self.uint64(point, "startTimeUnixNano", point_path, required=False)
+            self.attributes(point, "attributes", point_path)
+            yield point, point_path
+        self.records += len(points) - 1
+
+    def _temporality(self, data, path):
+        if data.get("aggregationTemporality") not in (1, 2):
+            self.fail(path, "aggregationTemporality must be 1 (delta) or 2 (cumulative)")
+
+    def metric(self, metric, path):
+        if not isinstance(metric.get("name"), str) or not metric["name"]:
+            self.fail(path, "metric needs a name")
+        kinds = [k for k in ("gauge", "sum", "histogram", "exponentialHistogram", "summary") if k in metric]
+        if len(kinds) != 1:
+            self.fail(path, "metric must have exactly one data field, got %r" % kinds)
+        kind = kinds[0]
+        data = metric[kind]
+        data_path = "%s.%s" % (path, kind)
+        if kind in ("sum", "histogram", "exponentialHistogram"):
+            self._temporality(data, data_path)
+        for point, point_path in self._points(data, data_path):
+            if kind in ("gauge", "sum"):
+                if ("asInt" in point) == ("asDouble" in point):
+                    self.fail(point_path, "number point needs exactly one of asInt/asDouble")
+            elif kind == "histogram":
+                count = self.uint64(point, "count", point_path)
+                buckets = [int(b) for b in point.get("bucketCounts", [])]
+                bounds = point.get("explicitBounds", [])
+                if buckets and len(buckets) != len(bounds) + 1:
+                    self.fail(point_path, "bucketCounts must have one more entry than explicitBounds")
+                if buckets and sum(buckets) != count:
+                    self.fail(point_path, "bucketCounts add up to %d, count is %d" % (sum(buckets), count))
+                if list(bounds) != sorted(bounds):
+                    self.fail(point_path, "explicitBounds must be sorted")
+            elif kind == "exponentialHistogram":
+                count = self.uint64(point, "count", point_path)
+                total = self.uint64(point, "zeroCount", point_path, required=False)
+                for side in ("positive", "negative"):
+                    buckets = point.get(side)
+                    if buckets:
+                        total += sum(int(b) for b in buckets.get("bucketCounts", []))
+                if total != count:
+                    self.fail(point_path, "buckets add up to %d, count is %d" % (total, count))
+                if not -10 <= point.get("scale", 0) <= 20:
+                    self.fail(point_path, "scale out of range")
+
+    def validate(self, endpoint, request):
+        if endpoint == "/v1/traces":
+            self.envelope(request, "resourceSpans", "scopeSpans", "spans", self.span)
+        elif endpoint == "/v1/logs":
+            self.envelope(request, "resourceLogs", "scopeLogs", "logRecords", self.log_record)
+        else:
+            self.envelope(request, "resourceMetrics", "scopeMetrics", "metrics", self.metric)
+        return self.records
+
+def decode_request(endpoint, content_type, body):
+    """Parse an export body into a proto3-JSON style dict and the Validator that suits it."""
+    if content_type.startswith("application/json"):
+        return json.loads(body), Validator()
+    if content_type.startswith("application/x-protobuf"):
+        if PROTOBUF_REQUESTS is None:
+            raise SchemaError("protobuf needs the opentelemetry-proto package")
+        message = PROTOBUF_REQUESTS[endpoint]()
+        message.ParseFromString(body)
+        return MessageToDict(message, use_integers_for_enums=True), Validator(_base64_id)
+    raise SchemaError("unsupported Content-Type %r" % content_type)
+
+def ingest(stats, path, content_type, encoding, body, received_ns):
+    """Decode, validate and count one export body; returns the problem found, or None."""
+    signal = SIGNALS[path]
+    try:
+        if encoding == "gzip":
+            body = zlib.decompress(body, 31)
+        elif encoding == "deflate":
+            body = zlib.decompress(body)
+        elif encoding:
+            raise SchemaError("unsupported Content-Encoding %r" % encoding)
+        request, validator = decode_request(path, content_type, body)
+        records = validator.validate(path, request)
+    except Exception as e:
+        with stats.lock:
+            stats.rejected += 1
+            stats.errors.append("%s %s" % (path, e))
+        return str(e)
+    with stats.lock:
+        stats.decoded_bytes[signal] += len(body)
+        if signal == "traces":
+            stats.spans += records
+            stats.span_delays_ms.extend((received_ns - end) / 1e6 for end in validator.span_end_times)
+        elif signal == "logs":
+            stats.logs += records
+        else:
+            stats.points += records
+    return None
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = {"traces": 0, "metrics": 0, "logs": 0}
+        self.wire_bytes = {"traces": 0, "metrics": 0, "logs": 0}
+        self.decoded_bytes = {"traces": 0, "metrics": 0, "logs": 0}
+        self.spans = 0
+        self.logs = 0
+        self.points = 0
+        self.rejected = 0
+        self.failed_on_purpose = 0
+        self.errors = []
+        # ms from a span's end time to the moment it reached the collector
+        self.span_delays_ms = []
+
+    def snapshot(self):
+        with self.lock:
+            delays = sorted(self.span_delays_ms)
+            return {
+                "requests": dict(self.requests),
+                "wire_bytes": dict(self.wire_bytes),
+                "decoded_bytes": dict(self.decoded_bytes),
+                "spans": self.spans,
+                "logs": self.logs,
+                "points": self.points,
+                "rejected": self.rejected,
+                "failed_on_purpose": self.failed_on_purpose,
+                "errors": self.errors[-10:],
+                "span_delay_ms": {
+                    "count": len(delays),
+                    "p50": delays[len(delays) // 2] if delays else None,
+                    "p99": delays[len(delays) * 99 // 100] if delays else None,
+                    "max": delays[-1] if delays else None,
+                },
+            }
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Send status, headers and body in one segment; split writes stall on Nagle + delayed ACK
+    wbufsize = 65536
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _reply(self, status, body=b"{}", content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        if "chunked" in self.headers.get("Transfer-Encoding", "").lower():
+            body = b""
+            while True:
+                size = int(self.rfile.readline().split(b";")[0], 16)
+                body += self.rfile.read(size)
+                self.rfile.readline()
+                if size == 0:
+                    return body
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._reply(200, json.dumps(self.server.stats.snapshot()).encode())
+        else:
+            self._reply(404)
+
+    def do_DELETE(self):
+        if self.path == "/stats":
+            with self.server.stats.lock:
+                self.server.stats.reset()
+            self._reply(200)
+        else:
+            self._reply(404)
+
+    def do_POST(self):
+        received_ns = time.time_ns()
+        body = self._read_body()
+        signal = SIGNALS.get(self.path)
+        if signal is None:
+            self._reply(404)
+            return
+        server = self.server
+        stats = server.stats
+        if server.delay_ms:
+            time.sleep(server.delay_ms / 1000)
+        with stats.lock:
+            stats.requests[signal] += 1
+            stats.wire_bytes[signal] += len(body)
+            fail = server.fail_every and stats.requests[signal] % server.fail_every == 0
+            if fail:
+                stats.failed_on_purpose += 1
+        if fail:
+            self._reply(503)
+            return
+        error = ingest(stats, self.path, self.headers.get("Content-Type", ""),
+                       self.headers.get("Content-Encoding", ""), body, received_ns)
+        if error is not None:
+            if server.verbose:
+                print("❌", self.path, error)
+            self._reply(400, json.dumps({"message": error}).encode())
+            return
+        self._reply(200)
+
+class StubCollector(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=4318, fail_every=0, delay_ms=0, verbose=False):
+        super().__init__((host, port), Handler)
+        self.stats = Stats()
+        self.fail_every = fail_every
+        self.delay_ms = delay_ms
+        self.verbose = verbose
+        self._thread = None
+
+    def start(self):
+        """Serve from a background thread; returns the bound port."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self.server_address[1]
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+def main(argv):
+    options = {"--host": "127.0.0.1", "--port": "4318", "--fail-every": "0", "--delay-ms": "0"}
+    verbose = False
+    i = 0
+    while i < len(argv):
+        if argv[i] == "--verbose":
+            verbose = True
+        elif argv[i] in options and i + 1 < len(argv):
+            i += 1
+            options[argv[i - 1]] = argv[i]
+        else:
+            print(__doc__)
+            return 2
+        i += 1
+    server = StubCollector(options["--host"], int(options["--port"]), int(options["--fail-every"]),
+                           float(options["--delay-ms"]), verbose)
+    print("Stub collector listening on %s:%d (protobuf %s)" % (
+        server.server_address[0], server.server_address[1],
+        "enabled" if PROTOBUF_REQUESTS is not None else "unavailable"))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(server.stats.snapshot(), indent=2))
+    server.server_close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
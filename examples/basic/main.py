@@ -52,4 +52,7 @@ otel.log(
 # End the span/trace
 otel.end_trace(span_id)
 
+# Spans are batched, so push anything still queued before we finish
+otel.flush()
+
 print("Example complete! Metric, log, and trace have been sent.")
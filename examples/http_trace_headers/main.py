@@ -2,6 +2,7 @@ import uasyncio as asyncio
 import time
 from wifi_client import WiFiConnection
 from opentelemetry_client import OpenTelemetryClient
+from opentelemetry_asyncio import AsyncExporter
 from machine import Pin
 
 # --- 1. Connect to WiFi ---
@@ -22,6 +23,8 @@ otel = OpenTelemetryClient(
     otel_collector=OTEL_COLLECTOR,
     resource_attributes=RESOURCE_ATTRIBUTES
 )
+# Telemetry is queued and sent by a background task so requests never wait on the collector
+exporter = AsyncExporter(otel)
 
 # --- 3. Simple HTTP server that uses traceparent from headers ---
 class SimpleHTTPServer:
@@ -52,6 +55,7 @@ class SimpleHTTPServer:
             kind="SERVER",
             parent_trace_id=trace_id,
             parent_span_id=parent_span_id,
+            trace_flags=ctx.get("trace_flags"),
             attributes=[
                 {"key": "http.method", "value": {"stringValue": "GET"}},
                 {"key": "event", "value": {"stringValue": "http_receive"}}
@@ -89,6 +93,7 @@ class SimpleHTTPServer:
         await writer.wait_closed()
 
     async def start(self):
+        exporter.start()
         server = await asyncio.start_server(self.handle_request, "0.0.0.0", self.port)
         print("HTTP server running on port", self.port)
         # Send a boot log on startup
@@ -111,3 +116,4 @@ except KeyboardInterrupt:
         attributes={"listen.port": str(server.port)},
         severity_text="INFO"
     )
+    asyncio.run(exporter.shutdown())
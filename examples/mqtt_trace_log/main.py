@@ -52,6 +52,7 @@ def mqtt_callback(topic, msg):
             kind="CONSUMER",
             parent_trace_id=parent_trace_id,
             parent_span_id=parent_span_id,
+            trace_flags=ctx.get("trace_flags"),
             attributes=[
                 {"key": "mqtt.topic", "value": {"stringValue": topic.decode()}},
                 {"key": "event", "value": {"stringValue": "mqtt_receive"}}
@@ -67,6 +68,7 @@ def mqtt_callback(topic, msg):
             attributes={"source": "mqtt"}
         )
         otel.end_trace(span_id)
+        otel.flush()
         print("MQTT message processed and traced.")
 
     except Exception as e:
@@ -53,6 +53,7 @@ def mqtt_callback(topic, msg):
             kind="CONSUMER",
             parent_trace_id=parent_trace_id,
             parent_span_id=parent_span_id,
+            trace_flags=ctx.get("trace_flags"),
             attributes=[
                 {"key": "mqtt.topic", "value": {"stringValue": topic.decode()}},
                 {"key": "event", "value": {"stringValue": "mqtt_request_receive"}}
@@ -75,6 +76,7 @@ def mqtt_callback(topic, msg):
             kind="PRODUCER",
             parent_trace_id=trace_id,  # link to previous
             parent_span_id=span_id,
+            trace_flags=otel.trace_flags,  # same sampling decision as the incoming span
             attributes=[
                 {"key": "mqtt.topic", "value": {"stringValue": MQTT_RESPONSE_TOPIC}},
                 {"key": "event", "value": {"stringValue": "mqtt_response_send"}}
@@ -99,6 +101,9 @@ def mqtt_callback(topic, msg):
         # 8. End the response span
         otel.end_trace(response_span_id)
 
+        # 9. Export both spans in a single request
+        otel.flush()
+
     except Exception as e:
         print("Failed to process MQTT message:", e)
 
@@ -0,0 +1,175 @@
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+from opentelemetry_client import ticks_us, ticks_diff
+from opentelemetry_transport import request_head, parse_header, timed_out
+
+_DRAIN_CHUNK = 128
+
+class AsyncExporter:
+    """Non-blocking transport for OpenTelemetryClient running under (u)asyncio.
+
+    Installed as the client's transport, it turns every export into a queued
+    request. A background task posts the queue over `asyncio.open_connection`,
+    so recording calls never wait on the network. The outcome of each request
+    goes back to the client, so failures reach the circuit breaker, the retry
+    list or persistent queue, and the pipeline stats like blocking exports do.
+    """
+    # Tells the client to hand requests over with submit() and expect the outcome later
+    deferred = True
+
+    def __init__(self, client, max_pending=8, interval_ms=1000, connect_timeout=5, read_timeout=5):
+        self.client = client
+        self.host = client.otel_collector
+        self.port = int(client.port)
+        self.max_pending = max_pending
+        self.interval_ms = interval_ms
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._host_header = f"Host: {self.host}:{self.port}\r\n"
+        self.pending = []
+        self.dropped = 0
+        self._wake = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._reader = None
+        self._writer = None
+        self._task = None
+        client.transport = self
+        client.streaming = False
+
+    def submit(self, path, body, headers=None, count=0, evict=True):
+        """Queue a request holding `count` records; returns False if the queue is full and `evict` is off."""
+        if len(self.pending) >= self.max_pending:
+            if not evict:
+                return False
+            # Keep the freshest telemetry when the collector can't keep up
+            old_path, _, _, old_count = self.pending.pop(0)
+            self.dropped += 1
+            stats = self.client._stats
+            if stats is not None:
+                stats.record_export(old_path, old_count, False, attempted=False)
+        self.pending.append((path, body, headers, count))
+        self._wake.set()
+        return True
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval_ms / 1000)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            # Lets the batch processors and meters hit their schedule without the app calling poll()
+            self.client.poll()
+            await self._drain()
+
+    async def flush(self):
+        """Export everything buffered in the client and wait until it has been sent."""
+        self.client.flush()
+        await self._drain()
+
+    async def shutdown(self):
+        self.client.shutdown()
+        await self._drain()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.close()
+
+    def close(self):
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except OSError:
+                pass
+        self._reader = None
+        self._writer = None
+
+    async def _drain(self):
+        client = self.client
+        breaker = client.circuit_breaker
+        async with self._lock:
+            while self.pending and (breaker is None or breaker.ready()):
+                path, body, headers, count = self.pending.pop(0)
+                started = ticks_us()
+                try:
+                    status = await self._post(path, body, headers)
+                except Exception as e:
+                    self.close()
+                    # Kept for a retry by the client; the next round starts after its backoff
+                    client._export_result(path, None, count, body, headers, e)
+                    return
+                client._export_result(path, None, count, body, headers, status, ticks_diff(ticks_us(), started))
+
+    async def _post(self, path, body, headers):
+        if isinstance(body, str):
+            body = body.encode()
+        head = request_head(path, self._host_header, headers, f"Content-Length: {len(body)}\r\n")
+        # Same rule as HTTPTransport: post again only if the kept-alive connection
+        # turned out to be closed, never after a timeout
+        reused = self._writer is not None
+        while True:
+            if self._writer is None:
+                self._reader, self._writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port), self.connect_timeout)
+            stale = False
+            try:
+                try:
+                    self._writer.write(head)
+                    self._writer.write(body)
+                    await self._writer.drain()
+                    status = await asyncio.wait_for(self._read_response(), self.read_timeout)
+                except OSError as e:
+                    stale = reused and not timed_out(e)
+                    raise
+                if status is None:
+                    stale = reused
+                    raise OSError("connection closed by collector")
+                return status
+            except (OSError, asyncio.TimeoutError):
+                self.close()
+                if not stale:
+                    raise
+                reused = False
+
+    async def _read_response(self):
+        reader = self._reader
+        status_line = await reader.readline()
+        if not status_line:
+            # EOF before any response byte: the collector had closed the connection
+            return None
+        status = int(status_line.split(None, 2)[1])
+        framing = [None, False, not status_line.startswith(b"HTTP/1.0")]
+        while True:
+            line = await reader.readline()
+            if not line or line == b"\r\n":
+                break
+            parse_header(line, framing)
+        length, chunked, keep_alive = framing
+        if chunked:
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                await self._discard(size + 2)
+                if size == 0:
+                    break
+        elif length is not None:
+            await self._discard(length)
+        else:
+            keep_alive = False
+        if not keep_alive:
+            self.close()
+        return status
+
+    async def _discard(self, n):
+        while n > 0:
+            chunk = await self._reader.read(min(n, _DRAIN_CHUNK))
+            if not chunk:
+                raise OSError("connection closed by collector")
+            n -= len(chunk)
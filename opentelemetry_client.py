@@ -1,41 +1,146 @@
+import sys
 import urandom
-import urequests
 import time
 import ujson
+from opentelemetry_transport import HTTPTransport, StreamBase
 
 try:
     import ntptime
 except ImportError:
     ntptime = None
 
+try:
+    import deflate
+except ImportError:
+    deflate = None
+
+try:
+    from time import ticks_ms, ticks_us, ticks_diff
+except ImportError:
+    # CPython fallback so the client can be exercised off-device
+    def ticks_ms():
+        return int(time.monotonic() * 1000)
+
+    def ticks_us():
+        return int(time.monotonic() * 1000000)
+
+    def ticks_diff(a, b):
+        return a - b
+
+def print_exception(e):
+    try:
+        sys.print_exception(e)
+    except AttributeError:
+        # CPython
+        import traceback
+        traceback.print_exception(type(e), e, e.__traceback__)
+
 MICROPY_EPOCH_OFFSET = 946684800  # seconds between 1970-01-01 and 2000-01-01
 
-def zfill(s, width):
-    s = str(s)
-    if len(s) >= width:
-        return s
-    return "0" * (width - len(s)) + s
+try:
+    from ubinascii import hexlify, unhexlify
+except ImportError:
+    from binascii import hexlify, unhexlify
+
+try:
+    from os import urandom as random_bytes
+except ImportError:
+    def random_bytes(n):
+        return bytes(urandom.getrandbits(8) for _ in range(n))
+
+INVALID_TRACE_ID = bytes(16)
+INVALID_SPAN_ID = bytes(8)
+
+def hex_id(value):
+    """Hex-encode a raw ID for the wire; text IDs pass through unchanged."""
+    if isinstance(value, (bytes, bytearray)):
+        return hexlify(value).decode()
+    return value
+
+def _raw_id(value):
+    return value
+
+def id_bytes(value, size):
+    """Normalise a trace (16 byte) or span (8 byte) ID to raw bytes, or None if it is not a valid one."""
+    if isinstance(value, (bytes, bytearray)):
+        # All zeros is the W3C invalid ID
+        return bytes(value) if len(value) == size and any(value) else None
+    if isinstance(value, int):
+        return value.to_bytes(size, "big") if 0 < value < (1 << (8 * size)) else None
+    if isinstance(value, str):
+        if len(value) == 2 * size:
+            try:
+                return id_bytes(unhexlify(value), size)
+            except ValueError:
+                pass
+        if value.isdigit():
+            return id_bytes(int(value), size)
+    return None
+
+def decode_traceparent(traceparent):
+    """Parse a W3C traceparent header into (trace_id, span_id, flags), or None if it is malformed."""
+    if isinstance(traceparent, bytes):
+        traceparent = traceparent.decode()
+    if not isinstance(traceparent, str):
+        return None
+    traceparent = traceparent.strip()
+    # version-traceid-spanid-flags, with room for fields added by future versions
+    if len(traceparent) < 55 or traceparent[2] != "-" or traceparent[35] != "-" or traceparent[52] != "-":
+        return None
+    version = traceparent[:2]
+    if version == "ff" or (version == "00" and len(traceparent) != 55):
+        return None
+    if len(traceparent) > 55 and traceparent[55] != "-":
+        return None
+    fields = traceparent[:55]
+    if fields.lower() != fields:
+        return None
+    try:
+        unhexlify(version)
+        trace_id = unhexlify(fields[3:35])
+        span_id = unhexlify(fields[36:52])
+        flags = unhexlify(fields[53:55])[0]
+    except ValueError:
+        return None
+    if trace_id == INVALID_TRACE_ID or span_id == INVALID_SPAN_ID:
+        return None
+    return trace_id, span_id, flags
+
+def encode_traceparent(trace_id, span_id, flags=1):
+    return "00-%s-%s-%02x" % (hex_id(trace_id), hex_id(span_id), flags)
 
 def parse_traceparent(traceparent):
     # Example: "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
-    if not traceparent or not isinstance(traceparent, str):
-        return None, None
-    parts = traceparent.strip().split("-")
-    if len(parts) != 4:
+    decoded = decode_traceparent(traceparent)
+    if decoded is None:
         return None, None
-    trace_id = parts[1]
-    parent_span_id = parts[2]
-    return trace_id, parent_span_id
-
-def ensure_str(val):
-    if isinstance(val, bytes):
-        return val.decode()
-    elif isinstance(val, str):
-        return str(val)
-    elif val is None:
-        return ""
-    else:
-        return str(val)
+    return hex_id(decoded[0]), hex_id(decoded[1])
+
+def decode_tracestate(tracestate):
+    """Parse a W3C tracestate header into a list of (key, value), or None if it is malformed."""
+    if not tracestate:
+        return []
+    entries = []
+    for member in tracestate.split(","):
+        member = member.strip()
+        if not member:
+            continue
+        key, eq, value = member.partition("=")
+        if not eq or not key or not value or len(key) > 256 or len(value) > 256:
+            return None
+        # Values may hold spaces, just not at the end (the member is already stripped)
+        if key.lower() != key or " " in key or "=" in value:
+            return None
+        for c in value:
+            if not " " <= c <= "~":
+                return None
+        entries.append((key, value))
+    if len(entries) > 32:
+        return None
+    return entries
+
+def encode_tracestate(entries):
+    return ",".join(key + "=" + value for key, value in entries)
 
 def get_epoch_offset():
     """Detect whether time.time() returns 1970 or 2000 epoch, and set the offset accordingly."""
@@ -49,13 +154,559 @@ def get_epoch_offset():
 
 EPOCH_OFFSET = get_epoch_offset()
 
+_time_ns = getattr(time, "time_ns", None)
+
+def wall_clock_ns():
+    """Current wall-clock time in Unix nanoseconds, straight from the RTC."""
+    if _time_ns is not None:
+        return _time_ns() + EPOCH_OFFSET * 1000000000
+    return (int(time.time()) + EPOCH_OFFSET) * 1000000000
+
+# ticks_us wraps after 2**30us (~18 min) on 32-bit ports and ticks_diff is only
+# valid for half of that, so the anchor is moved forward before it gets close.
+_REBASE_US = 1 << 28
+_REBASE_MS = 400000
+
+# Unix ns at the moment ticks_us() read _anchor_us (and ticks_ms() read _anchor_ms)
+_anchor_ns = 0
+_anchor_us = 0
+_anchor_ms = 0
+
+def anchor_clock(unix_ns=None):
+    """Pin span timestamps to wall-clock time; call again whenever the RTC is set."""
+    global _anchor_ns, _anchor_us, _anchor_ms
+    _anchor_us = ticks_us()
+    _anchor_ms = ticks_ms()
+    _anchor_ns = unix_ns if unix_ns is not None else wall_clock_ns()
+
+def now_unix_nano():
+    """Wall-clock time in Unix nanoseconds with ticks_us resolution, never going backwards."""
+    elapsed = ticks_diff(ticks_us(), _anchor_us)
+    # After an idle gap of a wrap or more, ticks_us can alias to a small delta; ticks_ms can't yet
+    if 0 <= elapsed < _REBASE_US and ticks_diff(ticks_ms(), _anchor_ms) < _REBASE_MS:
+        return _anchor_ns + elapsed * 1000
+    return _rebase()
+
+def _rebase():
+    global _anchor_ns, _anchor_us, _anchor_ms
+    us = ticks_us()
+    ms = ticks_ms()
+    elapsed_ms = ticks_diff(ms, _anchor_ms)
+    if elapsed_ms < _REBASE_MS:
+        # ticks_us hasn't wrapped past the anchor yet, so keep full resolution
+        _anchor_ns += ticks_diff(us, _anchor_us) * 1000
+    else:
+        # Idle for minutes: fall back to ticks_ms, which stays valid for days
+        _anchor_ns += elapsed_ms * 1000000
+    _anchor_us = us
+    _anchor_ms = ms
+    return _anchor_ns
+
+anchor_clock()
+
+# Span.set_status codes (OTLP Status.StatusCode)
+STATUS_UNSET = 0
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+def any_value(value):
+    """Wrap a Python value as an OTLP AnyValue, keeping ints, floats and bools as their own types."""
+    if isinstance(value, dict):
+        # Already an AnyValue
+        return value
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": value}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, str):
+        return {"stringValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [any_value(v) for v in value]}}
+    return {"stringValue": str(value)}
+
+def _raw_value(value):
+    # The Python value inside a scalar AnyValue; arrays and kvlists stay AnyValue dicts
+    if len(value) == 1:
+        kind, inner = next(iter(value.items()))
+        if kind == "intValue":
+            return int(inner)
+        if kind in ("stringValue", "doubleValue", "boolValue"):
+            return inner
+    return value
+
+def _item_name(item):
+    return item[0]
+
+def attribute_items(attributes):
+    """Sorted (key, value) pairs of a dict or an OTLP attribute list, as kept by Attributes."""
+    if not attributes:
+        return ()
+    if isinstance(attributes, dict):
+        # Keys are unique, so the values are never compared
+        return tuple(sorted(attributes.items()))
+    if isinstance(attributes, list):
+        return tuple(sorted(((a["key"], _raw_value(a["value"])) for a in attributes), key=_item_name))
+    raise TypeError("Attributes must be a list of dictionaries, a dictionary or bound Attributes")
+
+# Values that can't collide across types in a key: "1" != 1, and neither equals 1.0 or True
+_PLAIN = (str, int)
+_CONTAINERS = (list, tuple, dict)
+
+def attribute_items_key(items):
+    """Hashable key for `items` that tells 1, 1.0 and True apart."""
+    for _, value in items:
+        if type(value) not in _PLAIN:
+            break
+    else:
+        # The common case: the items are the key
+        return items
+    key = []
+    for name, value in items:
+        kind = type(value)
+        if kind in _PLAIN:
+            key.append((name, value))
+        else:
+            # Tagged with the type; containers by repr, as they aren't hashable or hold mixed types
+            key.append((name, repr(value) if kind in _CONTAINERS else value, kind))
+    return tuple(key)
+
+class Attributes:
+    """An immutable attribute set whose OTLP form is built once.
+
+    Get one from `bind_attributes`: equal sets always return the same object,
+    so metric series are found by identity and spans, logs and data points
+    reuse `otlp` instead of rebuilding it on every call.
+    """
+    __slots__ = ("items", "otlp")
+
+    def __init__(self, items):
+        self.items = items
+        # Shared by every record that uses this set; never mutate it
+        self.otlp = [{"key": k, "value": any_value(v)} for k, v in items]
+
+# Every set bound so far, keyed by attribute_items_key. Meant for the handful of
+# static sets a device uses; each distinct set stays in RAM for good.
+_bound_attributes = {}
+
+def bind_attributes(attributes):
+    """Return the interned Attributes handle for a dict, an OTLP attribute list or a handle."""
+    if isinstance(attributes, Attributes):
+        return attributes
+    items = attribute_items(attributes)
+    key = attribute_items_key(items)
+    handle = _bound_attributes.get(key)
+    if handle is None:
+        handle = _bound_attributes[key] = Attributes(items)
+    return handle
+
+def _attribute_store(attributes):
+    # Raw values keyed by name; OTLP-style list input keeps its AnyValue dicts.
+    # A bound set is kept as is and only copied if the span changes it.
+    if not attributes:
+        return None
+    if isinstance(attributes, Attributes):
+        return attributes
+    if isinstance(attributes, dict):
+        return dict(attributes)
+    if isinstance(attributes, list):
+        return {a["key"]: a["value"] for a in attributes}
+    raise TypeError("Attributes must be a list of dictionaries, a dictionary or bound Attributes")
+
+def _attribute_list(store):
+    if not store:
+        return []
+    if isinstance(store, Attributes):
+        return store.otlp
+    return [{"key": k, "value": any_value(v)} for k, v in store.items()]
+
+class Span:
+    """An open or finished span, kept compact until it is encoded for export."""
+    __slots__ = ("trace_id", "span_id", "parent_span_id", "name", "kind", "start_time", "end_time",
+                 "attributes", "events", "status_code", "status_message")
+
+    def __init__(self, trace_id, span_id, parent_span_id, name, kind, start_time, attributes=None):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_span_id = parent_span_id
+        self.name = name
+        self.kind = kind
+        self.start_time = start_time
+        self.end_time = 0
+        self.attributes = _attribute_store(attributes)
+        self.events = None
+        self.status_code = STATUS_UNSET
+        self.status_message = ""
+
+    def set_attribute(self, key, value):
+        if self.attributes is None:
+            self.attributes = {}
+        elif isinstance(self.attributes, Attributes):
+            self.attributes = dict(self.attributes.items)
+        self.attributes[key] = value
+
+    def add_event(self, name, attributes=None, timestamp=None):
+        if self.events is None:
+            self.events = []
+        self.events.append((timestamp or now_unix_nano(), name, _attribute_store(attributes)))
+
+    def set_status(self, code, message=""):
+        if isinstance(code, str):
+            code = {"UNSET": STATUS_UNSET, "OK": STATUS_OK, "ERROR": STATUS_ERROR}[code.upper()]
+        self.status_code = code
+        self.status_message = message
+
+    def to_otlp(self, encode_id=hex_id):
+        span = {
+            "traceId": encode_id(self.trace_id),
+            "spanId": encode_id(self.span_id),
+            "parentSpanId": encode_id(self.parent_span_id) if self.parent_span_id else "",
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": self.start_time,
+            "endTimeUnixNano": self.end_time,
+            "attributes": _attribute_list(self.attributes)
+        }
+        if self.events:
+            span["events"] = [
+                {"timeUnixNano": t, "name": name, "attributes": _attribute_list(attributes)}
+                for t, name, attributes in self.events
+            ]
+        if self.status_code:
+            span["status"] = {"code": self.status_code, "message": self.status_message}
+        return span
+
+class SpanRecords:
+    """Finished spans that turn into OTLP dicts one at a time, as an encoder iterates them.
+
+    A streamed or protobuf export then never holds the dict tree of the whole
+    batch. It can be iterated again, e.g. when a stale connection is replaced.
+    """
+    __slots__ = ("spans", "encode_id")
+
+    def __init__(self, spans, encode_id=hex_id):
+        self.spans = spans
+        self.encode_id = encode_id
+
+    def __len__(self):
+        return len(self.spans)
+
+    def __iter__(self):
+        encode_id = self.encode_id
+        for span in self.spans:
+            yield span.to_otlp(encode_id)
+
+SCOPE = {"name": "micropython-client"}
+
+# Responses after which the same request may succeed later
+RETRYABLE_STATUS = (429, 502, 503, 504)
+
+# endpoint -> (resource list key, scope list key, record list key)
+_JSON_KEYS = {
+    "/v1/traces": ("resourceSpans", "scopeSpans", "spans"),
+    "/v1/metrics": ("resourceMetrics", "scopeMetrics", "metrics"),
+    "/v1/logs": ("resourceLogs", "scopeLogs", "logRecords"),
+}
+
+def json_envelope(endpoint, resource_attributes, scope):
+    """Pre-serialize everything in an OTLP/JSON request except the record list."""
+    resource_key, scope_key, records_key = _JSON_KEYS[endpoint]
+    prefix = '{"%s":[{"resource":{"attributes":%s},"%s":[{"scope":%s,"%s":' % (
+        resource_key, ujson.dumps(resource_attributes), scope_key, ujson.dumps(scope), records_key)
+    return prefix.encode(), b"}]}]}"
+
+def json_encode_records(envelope, records):
+    prefix, suffix = envelope
+    if not isinstance(records, list):
+        records = list(records)
+    return prefix + ujson.dumps(records).encode() + suffix
+
+def json_stream_records(envelope, records, stream):
+    prefix, suffix = envelope
+    stream.write(prefix)
+    stream.write(b"[")
+    for i, record in enumerate(records):
+        if i:
+            stream.write(b",")
+        ujson.dump(record, stream)
+    stream.write(b"]")
+    stream.write(suffix)
+
+class CompressingWriter(StreamBase):
+    """Compress everything written to it into `stream` for the given Content-Encoding."""
+    def __init__(self, stream, encoding="gzip"):
+        self.bytes_in = 0
+        self._stream = stream
+        if deflate is not None:
+            self._deflate = deflate.DeflateIO(stream, deflate.GZIP if encoding == "gzip" else deflate.ZLIB)
+            self._zlib = None
+        else:
+            import zlib
+            self._deflate = None
+            self._zlib = zlib.compressobj(wbits=31 if encoding == "gzip" else 15)
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        self.bytes_in += len(data)
+        if self._deflate is not None:
+            self._deflate.write(data)
+        else:
+            out = self._zlib.compress(data)
+            if out:
+                self._stream.write(out)
+        return len(data)
+
+    def finish(self):
+        if self._deflate is not None:
+            self._deflate.close()
+        else:
+            self._stream.write(self._zlib.flush())
+
+def compress(data, encoding="gzip"):
+    """Compress `data` for the given Content-Encoding ("gzip" or "deflate")."""
+    import io
+    buf = io.BytesIO()
+    writer = CompressingWriter(buf, encoding)
+    writer.write(data)
+    writer.finish()
+    return buf.getvalue()
+
+class CircuitBreaker:
+    """Stop export attempts while the collector is failing, and retry after a growing delay.
+
+    Every failed export starts a backoff delay: `initial_backoff_ms`, doubled
+    on each further failure up to `max_backoff_ms`, with a random part of up
+    to half of it taken off so devices that lost the same collector don't all
+    come back at the same moment. Failed requests kept in RAM are retried once
+    the delay has passed. After `failure_threshold` failures in a row the
+    breaker opens and new exports are skipped too, until the delay lets one
+    probe through. One successful export closes the breaker.
+
+    While it is open, `policy` decides what happens to new telemetry:
+    "buffer" keeps spans and logs in the processors' queues (which drop
+    beyond their size as usual) and metrics in their meters, "drop" throws
+    every batch away without encoding it.
+    """
+    def __init__(self, failure_threshold=3, initial_backoff_ms=1000, max_backoff_ms=60000, policy="buffer"):
+        if policy not in ("buffer", "drop"):
+            raise ValueError("Unsupported policy: %s" % policy)
+        self.failure_threshold = failure_threshold
+        self.initial_backoff_ms = initial_backoff_ms
+        self.max_backoff_ms = max_backoff_ms
+        self.policy = policy
+        self.failures = 0
+        self.is_open = False
+        self.skipped = 0
+        self._failed_at = 0
+        self._delay_ms = 0
+
+    def ready(self):
+        """True if an export may be attempted now; once the delay is up this lets one probe through."""
+        return not self.is_open or ticks_diff(ticks_ms(), self._failed_at) >= self._delay_ms
+
+    def retry_ready(self):
+        """True if a request that failed may be sent again now."""
+        return not self.failures or ticks_diff(ticks_ms(), self._failed_at) >= self._delay_ms
+
+    def probe(self):
+        """End the current delay early, so flush() and shutdown() get one attempt before giving up."""
+        self._delay_ms = 0
+
+    def record_success(self):
+        if self.is_open:
+            print("✅ Collector reachable again after", self.failures, "failed exports")
+        self.failures = 0
+        self.is_open = False
+
+    def record_failure(self):
+        self.failures += 1
+        delay = self.initial_backoff_ms << min(self.failures - 1, 16)
+        if delay > self.max_backoff_ms:
+            delay = self.max_backoff_ms
+        jitter = int.from_bytes(random_bytes(2), "big") * (delay // 2) // 0xFFFF
+        self._delay_ms = delay - jitter
+        self._failed_at = ticks_ms()
+        if self.failures < self.failure_threshold:
+            return
+        if not self.is_open:
+            print("⚠️  Collector unreachable, pausing exports")
+        self.is_open = True
+
+class BatchSpanProcessor:
+    """Queue finished spans and export them in batches through `export(spans)`.
+
+    There is no background thread: the flush delay is checked whenever a span
+    ends or `poll()` is called from the application loop.
+    """
+    def __init__(self, export=None, max_queue_size=64, max_export_batch_size=32, schedule_delay_ms=5000):
+        self.export = export
+        self.max_queue_size = max_queue_size
+        self.max_export_batch_size = max_export_batch_size
+        self.schedule_delay_ms = schedule_delay_ms
+        self.queue = []
+        self.dropped = 0
+        # Set by the client; returns False while exports are paused, so spans stay queued
+        self.ready = None
+        self._last_export = ticks_ms()
+        self._shutdown = False
+
+    def on_end(self, span):
+        if self._shutdown:
+            return
+        if len(self.queue) >= self.max_queue_size:
+            self.dropped += 1
+            return
+        self.queue.append(span)
+        if len(self.queue) >= self.max_export_batch_size:
+            if self.ready is None or self.ready():
+                self._export_batch()
+        else:
+            self.poll()
+
+    def poll(self):
+        if self.queue and ticks_diff(ticks_ms(), self._last_export) >= self.schedule_delay_ms:
+            self.flush()
+
+    def flush(self):
+        while self.queue and (self.ready is None or self.ready()):
+            self._export_batch()
+        self._last_export = ticks_ms()
+
+    def shutdown(self):
+        if self._shutdown:
+            return
+        self.flush()
+        self._shutdown = True
+
+    def _export_batch(self):
+        batch = self.queue[:self.max_export_batch_size]
+        del self.queue[:self.max_export_batch_size]
+        self._last_export = ticks_ms()
+        self.export(batch)
+
+class BatchLogRecordProcessor:
+    """Buffer log records in a fixed-size ring and export them in batches through `export(records, dropped)`.
+
+    When the ring is full the oldest record is overwritten rather than blocking
+    the caller; `dropped` is the number lost since the previous export.
+    """
+    def __init__(self, export=None, max_queue_size=64, max_export_batch_size=32, schedule_delay_ms=5000):
+        self.export = export
+        self.max_queue_size = max_queue_size
+        self.max_export_batch_size = max_export_batch_size
+        self.schedule_delay_ms = schedule_delay_ms
+        self._ring = [None] * max_queue_size
+        self._head = 0
+        self._count = 0
+        self.dropped = 0
+        self._unreported_dropped = 0
+        # Set by the client; returns False while exports are paused, so records stay in the ring
+        self.ready = None
+        self._last_export = ticks_ms()
+        self._shutdown = False
+
+    def __len__(self):
+        return self._count
+
+    def on_emit(self, record):
+        if self._shutdown:
+            return
+        size = self.max_queue_size
+        if self._count == size:
+            # Overwrite the oldest record
+            self._ring[self._head] = record
+            self._head = (self._head + 1) % size
+            self.dropped += 1
+            self._unreported_dropped += 1
+        else:
+            self._ring[(self._head + self._count) % size] = record
+            self._count += 1
+        if self._count >= self.max_export_batch_size:
+            if self.ready is None or self.ready():
+                self._export_batch()
+        else:
+            self.poll()
+
+    def poll(self):
+        if self._count and ticks_diff(ticks_ms(), self._last_export) >= self.schedule_delay_ms:
+            self.flush()
+
+    def flush(self):
+        while self._count and (self.ready is None or self.ready()):
+            self._export_batch()
+        self._last_export = ticks_ms()
+
+    def shutdown(self):
+        if self._shutdown:
+            return
+        self.flush()
+        self._shutdown = True
+
+    def _export_batch(self):
+        ring = self._ring
+        size = self.max_queue_size
+        n = min(self._count, self.max_export_batch_size)
+        batch = []
+        for _ in range(n):
+            batch.append(ring[self._head])
+            ring[self._head] = None
+            self._head = (self._head + 1) % size
+        self._count -= n
+        dropped = self._unreported_dropped
+        self._unreported_dropped = 0
+        self._last_export = ticks_ms()
+        self.export(batch, dropped)
+
 class OpenTelemetryClient:
-    def __init__(self, wifi, otel_collector, port=4318, resource_attributes=None, sync_time=True):
+    def __init__(self, wifi, otel_collector, port=4318, resource_attributes=None, sync_time=True, span_processor=None, log_processor=None, transport=None, wire_format="json", compression=None, compression_threshold=1024, streaming=False, persistent_queue=None, self_telemetry=False, self_telemetry_interval_ms=None, sampler=None, circuit_breaker=None, sleep_store=None, max_retry_requests=4):
         self.wifi = wifi
         self.otel_collector = otel_collector
         self.port = port
+        # Ensure the URL is not host:port:port style
+        if ':' in str(otel_collector):
+            print("⚠️  Warning: otel_collector contains ':'. You should pass only the host (e.g., '10.231.1.200'), not 'host:port'. Fixing for you.")
+            self.otel_collector, self.port = otel_collector.split(':', 1)
+        self.transport = transport if transport is not None else HTTPTransport(self.otel_collector, self.port)
+        if wire_format == "json":
+            self._make_envelope = json_envelope
+            self._encode_id = hex_id
+            self._encode = json_encode_records
+            self._stream_encode = json_stream_records
+            self._content_type = "application/json"
+        elif wire_format == "protobuf":
+            # Only pulled into RAM when asked for
+            import opentelemetry_protobuf
+            self._make_envelope = opentelemetry_protobuf.envelope
+            self._encode_id = _raw_id
+            self._encode = opentelemetry_protobuf.encode_records
+            self._stream_encode = opentelemetry_protobuf.stream_records
+            self._content_type = opentelemetry_protobuf.CONTENT_TYPE
+        else:
+            raise ValueError("Unsupported wire_format: %s" % wire_format)
+        if compression not in (None, "gzip", "deflate"):
+            raise ValueError("Unsupported compression: %s" % compression)
+        if compression is not None:
+            try:
+                compress(b"", compression)
+            except Exception as e:
+                # Many MicroPython ports ship deflate without the compressor
+                print("⚠️  Warning: compression not supported on this build, sending uncompressed.", e)
+                compression = None
+        self.compression = compression
+        self.compression_threshold = compression_threshold
+        self.uncompressed_bytes = 0
+        self.compressed_bytes = 0
+        # Encode straight into the transport's fixed buffer instead of building the whole body
+        self.streaming = streaming and hasattr(self.transport, "send_stream")
+        self.persistent_queue = persistent_queue
         self.trace_id = self.generate_trace_id()
         self.parent_span_id = None
+        # Sampled flag of the current context, written into outgoing traceparent headers
+        self.trace_flags = 1
+        # None follows the parent's sampled flag and records every root span
+        self.sampler = sampler
         self.resource_attributes = resource_attributes or {}
         self.SPAN_KIND_MAP = {
             "SERVER": 2,
@@ -65,9 +716,67 @@ class OpenTelemetryClient:
             "INTERNAL": 1
         }
         self.active_spans = {}
+        self.span_processor = span_processor if span_processor is not None else BatchSpanProcessor()
+        if self.span_processor.export is None:
+            self.span_processor.export = self._export_spans
+        self.log_processor = log_processor if log_processor is not None else BatchLogRecordProcessor()
+        if self.log_processor.export is None:
+            self.log_processor.export = self._export_logs
+        # False turns the breaker off: every export is attempted, however long the collector has been down
+        if circuit_breaker is None:
+            circuit_breaker = CircuitBreaker()
+        self.circuit_breaker = circuit_breaker or None
+        if self.circuit_breaker is not None and self.circuit_breaker.policy == "buffer":
+            for processor in (self.span_processor, self.log_processor):
+                if getattr(processor, "ready", False) is None:
+                    processor.ready = self.circuit_breaker.ready
+        self.meters = []
+        # While poll(), flush() or shutdown() runs the meters, their metrics are gathered here
+        self._batching_metrics = False
+        self._metric_batch = None
+        # Set by an alternative exporter (e.g. StatsdExporter) to take over send_*_metric
+        self.metric_exporter = None
+        # Pipeline counters; None keeps every call site down to one attribute check
+        self._stats = None
+        if self_telemetry:
+            from opentelemetry_stats import PipelineStats
+            self._stats = PipelineStats(self, self_telemetry_interval_ms)
+            if self_telemetry_interval_ms is not None:
+                self.meters.append(self._stats)
+            if persistent_queue is not None:
+                persistent_queue.on_evict = self._dropped
+        # Unix seconds of the last successful NTP sync; carried across deep sleep by the sleep store
+        self.synced_at = 0
+        self.sleep_store = sleep_store
+        # Encoded (endpoint, body, headers, record count) requests waiting to be sent again, oldest
+        # first: exports that failed while there was no persistent queue, and those saved by
+        # prepare_for_sleep() before the last deep sleep
+        self._retry_requests = []
+        self.max_retry_requests = max_retry_requests
+        self.retry_dropped = 0
+        # Set while prepare_for_sleep() saves what is left: exports are encoded and spooled, not sent
+        self._export_paused = False
+        self._sleep_spool = None
+        if sleep_store is not None and self._resume(sleep_store):
+            # The clock came through the sleep and the last sync is recent enough: no NTP round
+            sync_time = False
         if sync_time:
             self.sync_time()
 
+    def _resume(self, store):
+        state = store.load()
+        if state is None:
+            return False
+        store.clear()
+        anchor_ns, sleep_ms, synced_at, requests = state
+        if wall_clock_ns() < anchor_ns:
+            # The RTC stopped during the sleep; continue from the saved clock plus the time asleep and since boot
+            anchor_clock(anchor_ns + (sleep_ms + ticks_ms()) * 1000000)
+        self.synced_at = synced_at
+        self._retry_requests = requests
+        print("✅ Resumed after sleep with", len(requests), "saved export requests")
+        return synced_at and now_unix_nano() // 1000000000 - synced_at < store.resync_after_s
+
     def sync_time(self):
         if ntptime is None:
             print("ntptime module not available, cannot sync time.")
@@ -76,27 +785,43 @@ class OpenTelemetryClient:
             try:
                 ntptime.settime()
                 print("NTP time set.")
+                self.synced_at = wall_clock_ns() // 1000000000
                 break
             except Exception as e:
                 print("Failed to set NTP time, retrying...", e)
                 time.sleep(2)
+        # The RTC may have jumped; timestamps continue from the new wall-clock time
+        anchor_clock()
         t = time.localtime()
         print("Current system time after NTP sync:", t)
         if t[0] < 2020:
             print("⚠️  Warning: System time still invalid! Traces may have wrong timestamps.")
 
     def _now_unix_nano(self):
-        return int((time.time() + EPOCH_OFFSET) * 1e9)
+        return now_unix_nano()
+
+    def _export_ready(self):
+        # Meters keep aggregating instead of collecting while a buffering breaker is open
+        breaker = self.circuit_breaker
+        return breaker is None or breaker.policy != "buffer" or breaker.ready()
 
     def generate_trace_id(self):
-        return "".join("{:08x}".format(urandom.getrandbits(32)) for _ in range(4))
+        return random_bytes(16)
 
     def generate_span_id(self):
-        return "".join("{:08x}".format(urandom.getrandbits(32)) for _ in range(2))
+        return random_bytes(8)
 
     def export_metric(self, name, value, metric_type="gauge", attributes=None, timestamp=None, **kwargs):
+        if self.metric_exporter is not None:
+            if self._stats is not None:
+                self._stats.points_created += 1
+            self.metric_exporter.export_metric(name, value, metric_type, attributes, kwargs)
+            return
         timestamp = timestamp or self._now_unix_nano()
-        attributes = [attrib for attrib in (attributes or []) if attrib.get("key") != "net.peer.port"]
+        if isinstance(attributes, Attributes):
+            attributes = attributes.otlp
+        else:
+            attributes = [attrib for attrib in (attributes or []) if attrib.get("key") != "net.peer.port"]
         metric = {
             "name": name,
             "unit": "",
@@ -134,16 +859,19 @@ class OpenTelemetryClient:
         else:
             raise ValueError("Unsupported metric_type: %s" % metric_type)
 
-        data = {
-            "resourceMetrics": [{
-                "resource": {"attributes": self.format_attributes(self.resource_attributes)},
-                "scopeMetrics": [{
-                    "scope": {"name": "micropython-client"},
-                    "metrics": [metric]
-                }]
-            }]
-        }
-        self._send_data("/v1/metrics", data)
+        if self._stats is not None:
+            self._stats.points_created += 1
+        self._export_metrics([metric])
+
+    def _export_metrics(self, metrics):
+        if self._batching_metrics:
+            # collect() builds a fresh list each time, so the first one can be extended in place
+            if self._metric_batch is None:
+                self._metric_batch = metrics
+            else:
+                self._metric_batch.extend(metrics)
+            return
+        self._send_data("/v1/metrics", metrics)
 
     def send_gauge_metric(self, name, value, attributes=None, timestamp=None):
         self.export_metric(name, value, metric_type="gauge", attributes=attributes, timestamp=timestamp)
@@ -160,86 +888,254 @@ class OpenTelemetryClient:
             count=count, sum=sum_value, bucketCounts=bucketCounts, explicitBounds=explicitBounds, aggregationTemporality=2
         )
 
-    def start_trace(self, name, kind="CLIENT", attributes=None, parent_trace_id=None, parent_span_id=None):
-        print("=== start_trace called ===")
-        print("Raw parent_trace_id:", parent_trace_id, "type:", type(parent_trace_id))
-        trace_id = parent_trace_id if parent_trace_id else self.generate_trace_id()
-        try:
-            if isinstance(trace_id, int):
-                trace_id = "{:032x}".format(trace_id)
-                print("Converted int trace_id to hex:", trace_id)
-            elif isinstance(trace_id, str):
-                if len(trace_id) == 32 and all(c in "0123456789abcdefABCDEF" for c in trace_id):
-                    print("trace_id is already a 32-char hex string:", trace_id)
-                elif trace_id.isdigit():
-                    print("trace_id is a decimal string, converting to hex...")
-                    trace_id = "{:032x}".format(int(trace_id))
-                    print("Converted decimal string to hex:", trace_id)
-                else:
-                    print("trace_id string is not 32-hex or decimal, using as-is:", trace_id)
-            else:
-                print("trace_id is of unknown type, using as-is:", trace_id)
-        except Exception as e:
-            print("❌ Error while converting trace_id:", trace_id, e)
-            raise
+    def start_trace(self, name, kind="CLIENT", attributes=None, parent_trace_id=None, parent_span_id=None, trace_flags=None):
+        trace_id = None
+        parent_sampled = None
+        if parent_trace_id:
+            # Accepts raw bytes, 32-char hex, ints and decimal strings
+            trace_id = id_bytes(parent_trace_id, 16)
+            if trace_id is None:
+                print("⚠️  Invalid parent_trace_id, starting a new trace:", parent_trace_id)
+        if trace_id is None:
+            trace_id = self.generate_trace_id()
+            parent_span_id = None
+        else:
+            if parent_span_id:
+                parent_span_id = id_bytes(parent_span_id, 8)
+            # Callers that don't pass the parent's flags get the old behaviour: the parent was sampled
+            parent_sampled = trace_flags is None or bool(trace_flags & 1)
 
         span_id = self.generate_span_id()
+        if self.sampler is None:
+            decision = parent_sampled is not False
+        else:
+            decision = self.sampler.should_sample(trace_id, name, kind, parent_sampled)
+        self.trace_id = trace_id
+        self.parent_span_id = span_id
+        if not decision:
+            # Only the context survives, so children and downstream services see flag 00
+            self.trace_flags = 0
+            return trace_id, span_id
+        self.trace_flags = 1
+
         start_time = self._now_unix_nano()
         kind_lookup_value = self.SPAN_KIND_MAP.get(kind.upper(), 1)
-        print(f"Kind Value (string value passed is {kind}): {kind_lookup_value}")
         if attributes is None:
             attributes = []
-        print("Received attributes:", attributes)
-        self.active_spans[span_id] = {
-            "traceId": trace_id,
-            "spanId": span_id,
-            "parentSpanId": parent_span_id if parent_span_id else "",
-            "name": name,
-            "kind": kind_lookup_value,
-            "startTimeUnixNano": start_time,
-            "attributes": self.format_attributes(attributes)
-        }
-        print(f"✅ Span Created: {name}, Kind: {kind_lookup_value}, traceId: {trace_id}, spanId: {span_id}")
-        self.trace_id = trace_id
-        self.parent_span_id = span_id
+        if self._stats is not None:
+            self._stats.spans_created += 1
+        span = Span(trace_id, span_id, parent_span_id, name, kind_lookup_value, start_time, attributes)
+        if decision is not True:
+            # Attributes the sampler wants on the spans it admits
+            for key, value in decision.items():
+                span.set_attribute(key, value)
+        self.active_spans[span_id] = span
         return trace_id, span_id
 
     def end_trace(self, span_id):
-        if span_id not in self.active_spans:
-            print(f"Warning: Attempted to end unknown span {span_id}")
+        span = self.active_spans.pop(id_bytes(span_id, 8), None)
+        if span is None:
+            # Unsampled spans are never stored, so ending one is not an error
             return
-        end_time = self._now_unix_nano()
-        span_data = self.active_spans.pop(span_id)
-        span_data["endTimeUnixNano"] = end_time + 10000000
-        trace_data = {
-            "resourceSpans": [{
-                "resource": {"attributes": self.format_attributes(self.resource_attributes)},
-                "scopeSpans": [{
-                    "scope": {"name": "micropython-client"},
-                    "spans": [span_data]
-                }]
-            }]
+        span.end_time = self._now_unix_nano()
+        self.span_processor.on_end(span)
+
+    def get_span(self, span_id):
+        """Return the open Span for `span_id` to set attributes, events or status on it.
+
+        Returns None if the span was not sampled or has already ended.
+        """
+        return self.active_spans.get(id_bytes(span_id, 8))
+
+    def _export_spans(self, spans):
+        self._send_data("/v1/traces", SpanRecords(spans, self._encode_id))
+
+    def poll(self):
+        """Export anything whose flush delay has expired; call this from the main loop."""
+        if self._retry_requests and self._retry_ready():
+            self._send_retries()
+        self.span_processor.poll()
+        self.log_processor.poll()
+        self._run_meters("poll")
+
+    def flush(self):
+        self._probe()
+        if self._retry_requests:
+            self._send_retries()
+        self.span_processor.flush()
+        self.log_processor.flush()
+        self._run_meters("flush")
+
+    def _probe(self):
+        # An open breaker would skip everything; let the first request through to find out
+        breaker = self.circuit_breaker
+        if breaker is not None and breaker.failures:
+            breaker.probe()
+
+    def _retry_ready(self):
+        breaker = self.circuit_breaker
+        return breaker is None or breaker.retry_ready()
+
+    def _send_retries(self, ready=None):
+        # Oldest first; stop at the first one that can't be delivered and keep the rest
+        requests = self._retry_requests
+        while requests and (ready is None or ready()):
+            endpoint, body, headers, count = requests[0]
+            if not self._resend(endpoint, body, headers, count):
+                break
+            requests.pop(0)
+
+    def prepare_for_sleep(self, sleep_ms=0, deadline_ms=3000):
+        """Export what is buffered, then save what is left for the next wake; call right before deep sleep.
+
+        Exports run over the transport's one kept-alive connection and stop
+        once `deadline_ms` has passed. Anything not delivered by then,
+        including the current meter readings, is encoded and saved to the
+        `sleep_store` together with the clock, or to the persistent queue if
+        there is no sleep store. Returns the number of requests saved there.
+        With neither, what is left stays in RAM, where deep sleep loses it:
+        a warning is printed and 0 returned.
+        """
+        started = ticks_ms()
+        breaker = self.circuit_breaker
+
+        def in_time():
+            return ticks_diff(ticks_ms(), started) < deadline_ms and (breaker is None or breaker.ready())
+
+        store = self.sleep_store
+        queue = self.persistent_queue
+        spool = self._sleep_spool = [] if store is not None or queue is not None else None
+        processors = (self.span_processor, self.log_processor)
+        saved_ready = [getattr(processor, "ready", None) for processor in processors]
+        try:
+            self._send_retries(in_time)
+            for processor in processors:
+                if hasattr(processor, "ready"):
+                    processor.ready = in_time
+                processor.flush()
+            meters_flushed = in_time()
+            if meters_flushed:
+                self._run_meters("flush")
+            # Out of time or the collector is down: everything still buffered is encoded and kept
+            self._export_paused = True
+            for processor in processors:
+                if hasattr(processor, "ready"):
+                    processor.ready = None
+                processor.flush()
+            if not meters_flushed:
+                self._run_meters("flush")
+        finally:
+            self._export_paused = False
+            self._sleep_spool = None
+            for processor, ready in zip(processors, saved_ready):
+                if ready is not None:
+                    processor.ready = ready
+            self.transport.close()
+        if spool is None:
+            if self._retry_requests:
+                print("⚠️  No sleep_store or persistent_queue:", len(self._retry_requests),
+                      "export requests are only in RAM and will be lost in deep sleep.")
+            return 0
+        requests = self._retry_requests + spool
+        self._retry_requests = []
+        if store is not None:
+            saved = store.save(now_unix_nano(), sleep_ms, self.synced_at, requests)
+            lost = requests[saved:]
+        else:
+            # Requests that failed earlier already went to flash; these are the ones still in RAM
+            saved = 0
+            lost = []
+            for request in requests:
+                if queue.put(*request):
+                    saved += 1
+                else:
+                    lost.append(request)
+        for endpoint, _, _, count in lost:
+            self._dropped(endpoint, count)
+        return saved
+
+    def shutdown(self):
+        # Nothing can wait for the breaker any more: after one probe, held-back records are
+        # sent, or go to the persistent queue, or are dropped
+        self._probe()
+        if self._retry_requests:
+            self._send_retries()
+        for processor in (self.span_processor, self.log_processor):
+            if getattr(processor, "ready", None) is not None:
+                processor.ready = None
+        self.span_processor.shutdown()
+        self.log_processor.shutdown()
+        self._run_meters("shutdown")
+        self.transport.close()
+        if self._retry_requests:
+            print("⚠️ ", len(self._retry_requests), "export requests could not be delivered, dropping them.")
+            self.retry_dropped += len(self._retry_requests)
+            for endpoint, _, _, count in self._retry_requests:
+                self._dropped(endpoint, count)
+            self._retry_requests = []
+
+    def _run_meters(self, method):
+        # Every meter that exports in this call adds to one /v1/metrics request
+        self._batching_metrics = True
+        try:
+            for meter in self.meters:
+                getattr(meter, method)()
+        finally:
+            self._batching_metrics = False
+            metrics = self._metric_batch
+            self._metric_batch = None
+        if metrics:
+            self._send_data("/v1/metrics", metrics)
+
+    def stats(self):
+        """Snapshot of the export pipeline: queue depths and drops, plus counters and export latency with self_telemetry."""
+        span_processor = self.span_processor
+        stats = {
+            "spans_dropped": getattr(span_processor, "dropped", 0),
+            "logs_dropped": getattr(self.log_processor, "dropped", 0),
+            "span_queue_depth": len(span_processor.queue) if hasattr(span_processor, "queue") else 0,
+            "log_queue_depth": getattr(self.log_processor, "_count", 0),
+            "uncompressed_bytes": self.uncompressed_bytes,
+            "compressed_bytes": self.compressed_bytes,
         }
-        self._send_data("/v1/traces", trace_data)
+        if hasattr(self.transport, "pending"):
+            stats["pending_requests"] = len(self.transport.pending)
+            stats["pending_dropped"] = self.transport.dropped
+        if self.persistent_queue is not None:
+            stats["persistent_queue_bytes"] = self.persistent_queue.size
+            stats["persistent_queue_evicted_segments"] = self.persistent_queue.evicted_segments
+        if self.max_retry_requests:
+            stats["retry_requests"] = len(self._retry_requests)
+            stats["retry_dropped"] = self.retry_dropped
+        if self.circuit_breaker is not None:
+            stats["exports_skipped"] = self.circuit_breaker.skipped
+            stats["circuit_open"] = self.circuit_breaker.is_open
+        if self._stats is not None:
+            self._stats.update(stats)
+        return stats
 
     def log(self, trace_id, span_id, body, attributes=None):
         timestamp = self._now_unix_nano()
-        log_data = {
-            "resourceLogs": [{
-                "resource": {"attributes": self.format_attributes(self.resource_attributes)},
-                "scopeLogs": [{
-                    "scope": {"name": "micropython-client"},
-                    "logRecords": [{
-                        "timeUnixNano": timestamp,
-                        "TraceId": trace_id,
-                        "SpanId": span_id,
-                        "body": {"stringValue": str(body)},
-                        "attributes": self.format_attributes(attributes or {})
-                    }]
-                }]
-            }]
+        log_record = {
+            "timeUnixNano": timestamp,
+            "body": {"stringValue": str(body)},
+            "attributes": self.format_attributes(attributes or {})
         }
-        self._send_data("/v1/logs", log_data)
+        self._set_log_context(log_record, trace_id, span_id)
+        if self._stats is not None:
+            self._stats.logs_created += 1
+        self.log_processor.on_emit(log_record)
+
+    def _set_log_context(self, log_record, trace_id, span_id):
+        # Raw IDs until export; _export_logs encodes them for the wire format
+        if trace_id:
+            trace_id = id_bytes(trace_id, 16)
+            if trace_id is not None:
+                log_record["traceId"] = trace_id
+        if span_id:
+            span_id = id_bytes(span_id, 8)
+            if span_id is not None:
+                log_record["spanId"] = span_id
 
     def send_log(self, body, attributes=None, trace_id=None, span_id=None, severity_text="INFO"):
         timestamp = self._now_unix_nano()
@@ -249,39 +1145,59 @@ class OpenTelemetryClient:
             "attributes": self.format_attributes(attributes or {}),
             "severityText": severity_text,
         }
-        if trace_id:
-            log_record["TraceId"] = trace_id
-        if span_id:
-            log_record["SpanId"] = span_id
-
-        log_data = {
-            "resourceLogs": [{
-                "resource": {"attributes": self.format_attributes(self.resource_attributes)},
-                "scopeLogs": [{
-                    "scope": {"name": "micropython-client"},
-                    "logRecords": [log_record]
-                }]
-            }]
-        }
-        self._send_data("/v1/logs", log_data)
+        self._set_log_context(log_record, trace_id, span_id)
+        if self._stats is not None:
+            self._stats.logs_created += 1
+        self.log_processor.on_emit(log_record)
+
+    def _export_logs(self, records, dropped=0):
+        if dropped:
+            # Make buffer overflow visible in the backend instead of losing it silently
+            records.append({
+                "timeUnixNano": self._now_unix_nano(),
+                "body": {"stringValue": f"Dropped {dropped} log records (buffer full)"},
+                "attributes": [{"key": "otel.dropped_log_records", "value": {"intValue": dropped}}],
+                "severityText": "WARN",
+                "severityNumber": 13,
+            })
+        encode_id = self._encode_id
+        for record in records:
+            if "traceId" in record:
+                record["traceId"] = encode_id(record["traceId"])
+            if "spanId" in record:
+                record["spanId"] = encode_id(record["spanId"])
+        self._send_data("/v1/logs", records)
 
     def format_attributes(self, attributes):
         if isinstance(attributes, dict):
-            return [{"key": k, "value": {"stringValue": str(v)}} for k, v in attributes.items()]
+            return [{"key": k, "value": any_value(v)} for k, v in attributes.items()]
         elif isinstance(attributes, list):
             return attributes
+        elif isinstance(attributes, Attributes):
+            return attributes.otlp
         else:
-            raise TypeError("Attributes must be a list of dictionaries or a dictionary")
+            raise TypeError("Attributes must be a list of dictionaries, a dictionary or bound Attributes")
+
+    def bind_attributes(self, attributes):
+        """Bind an attribute set once and pass the handle to spans, logs and instruments."""
+        return bind_attributes(attributes)
 
     def extract_context_from_payload(self, payload):
         trace_id = None
         parent_span_id = None
+        trace_flags = None
+        tracestate = None
         if "traceparent" in payload:
-            trace_id, parent_span_id = parse_traceparent(payload["traceparent"])
+            decoded = decode_traceparent(payload["traceparent"])
+            if decoded is not None:
+                trace_id, parent_span_id, trace_flags = decoded
+                tracestate = decode_tracestate(payload.get("tracestate"))
+            else:
+                print("⚠️  Ignoring malformed traceparent:", payload["traceparent"])
         else:
-            trace_id = payload.get("trace_id")
-            parent_span_id = payload.get("parent_span_id")
-        ctx = {"trace_id": trace_id, "parent_span_id": parent_span_id}
+            trace_id = id_bytes(payload.get("trace_id"), 16)
+            parent_span_id = id_bytes(payload.get("parent_span_id"), 8)
+        ctx = {"trace_id": trace_id, "parent_span_id": parent_span_id, "trace_flags": trace_flags, "tracestate": tracestate}
         print("Extracted context:", ctx)
         return ctx
 
@@ -295,60 +1211,254 @@ class OpenTelemetryClient:
             kind="CONSUMER",
             attributes=[],
             parent_trace_id=trace_id,
-            parent_span_id=parent_span_id
+            parent_span_id=parent_span_id,
+            trace_flags=ctx.get("trace_flags")
         )
 
-    def build_traceparent(self, trace_id, span_id, sampled="01"):
-        try:
-            trace_id = ensure_str(trace_id or self.trace_id or self.generate_trace_id())
-            span_id = ensure_str(span_id or self.parent_span_id or self.generate_span_id())
-            trace_id = zfill(trace_id, 32)
-            span_id = zfill(span_id, 16)
-            result = f"00-{trace_id}-{span_id}-{sampled}"
-            return result
-        except Exception as e:
-            print("[build_traceparent] Exception occurred:", e)
-            try:
-                import sys
-                print("[build_traceparent] Exception info:", sys.exc_info())
-            except Exception:
-                pass
-            raise
+    def build_traceparent(self, trace_id, span_id, sampled=None):
+        if sampled is None:
+            sampled = self.trace_flags
+        trace_id = id_bytes(trace_id or self.trace_id, 16)
+        span_id = id_bytes(span_id or self.parent_span_id or self.generate_span_id(), 8)
+        if trace_id is None or span_id is None:
+            raise ValueError("Cannot build traceparent from invalid trace or span ID")
+        return encode_traceparent(trace_id, span_id, int(sampled, 16) if isinstance(sampled, str) else sampled)
 
-    def inject_context_to_payload(self, payload, trace_id=None, span_id=None, sampled="01"):
+    def inject_context_to_payload(self, payload, trace_id=None, span_id=None, sampled=None, tracestate=None):
         traceparent = self.build_traceparent(trace_id, span_id, sampled)
         payload["traceparent"] = traceparent
-        payload["trace_id"] = trace_id or self.trace_id
-        payload["parent_span_id"] = span_id or self.parent_span_id
+        if tracestate:
+            payload["tracestate"] = encode_tracestate(tracestate)
+        payload["trace_id"] = traceparent[3:35]
+        payload["parent_span_id"] = traceparent[36:52]
         return payload
 
-    def inject_context_to_headers(self, headers, trace_id=None, span_id=None, sampled="01"):
-        traceparent = self.build_traceparent(trace_id, span_id, sampled)
-        headers["traceparent"] = traceparent
+    def inject_context_to_headers(self, headers, trace_id=None, span_id=None, sampled=None, tracestate=None):
+        headers["traceparent"] = self.build_traceparent(trace_id, span_id, sampled)
+        if tracestate:
+            headers["tracestate"] = encode_tracestate(tracestate)
         return headers
 
-    def _send_data(self, endpoint, data):
-        # Ensure the URL is not host:port:port style
-        if ':' in str(self.otel_collector):
-            print("⚠️  Warning: otel_collector contains ':'. You should pass only the host (e.g., '10.231.1.200'), not 'host:port'. Fixing for you.")
-            host, port = self.otel_collector.split(':', 1)
-            url = f"http://{host}:{port}{endpoint}"
-        else:
-            url = f"http://{self.otel_collector}:{self.port}{endpoint}"
-        headers = {'Content-Type': 'application/json'}
+    @property
+    def resource_attributes(self):
+        return self._resource_attributes
+
+    @resource_attributes.setter
+    def resource_attributes(self, attributes):
+        self._resource_attributes = attributes
+        self._envelopes = {}
+        # Key of the attributes the cached envelopes were built from
+        self._envelope_resource = None
+
+    def _resource_key(self):
+        attributes = self._resource_attributes
+        if isinstance(attributes, Attributes):
+            # Immutable, so the handle itself will do
+            return attributes
+        # A dict or OTLP list may be edited in place; its normalized items are a snapshot
+        return attribute_items_key(attribute_items(attributes))
+
+    def _envelope(self, endpoint):
+        key = self._resource_key()
+        if key != self._envelope_resource:
+            # Replaced or changed in place since the envelopes were built
+            self._envelopes = {}
+            self._envelope_resource = key
+        envelope = self._envelopes.get(endpoint)
+        if envelope is None:
+            envelope = self._make_envelope(endpoint, self.format_attributes(self._resource_attributes), SCOPE)
+            self._envelopes[endpoint] = envelope
+        return envelope
+
+    def _write_body(self, envelope, records, stream):
+        start = stream.bytes_written
+        if self.compression is None:
+            self._stream_encode(envelope, records, stream)
+            if self._stats is not None:
+                self._stats.bytes_sent += stream.bytes_written - start
+            return
+        writer = CompressingWriter(stream, self.compression)
+        self._stream_encode(envelope, records, writer)
+        writer.finish()
+        self.uncompressed_bytes += writer.bytes_in
+        self.compressed_bytes += stream.bytes_written - start
+        if self._stats is not None:
+            self._stats.bytes_sent += stream.bytes_written - start
+
+    def _encode_body(self, endpoint, records, headers):
         try:
-            json_data = ujson.dumps(data)
+            body = self._encode(self._envelope(endpoint), records)
         except Exception as e:
-            print("❌ Error during ujson.dumps!")
-            import sys
-            sys.print_exception(e)
+            print("❌ Error while encoding", endpoint)
+            print_exception(e)
             raise
+        if self.compression is not None and len(body) >= self.compression_threshold:
+            if isinstance(body, str):
+                body = body.encode()
+            compressed = compress(body, self.compression)
+            self.uncompressed_bytes += len(body)
+            self.compressed_bytes += len(compressed)
+            body = compressed
+            headers['Content-Encoding'] = self.compression
+        return body
+
+    def _send_data(self, endpoint, records):
+        stats = self._stats
+        breaker = self.circuit_breaker
+        paused = self._export_paused
+        if self._retry_requests and not paused and self._retry_ready():
+            # Older requests go first, and if they fail the breaker decides about this one
+            self._send_retries()
+        if paused or (breaker is not None and not breaker.ready()):
+            # The collector is known to be down (or we're about to sleep): don't encode, connect or wait
+            count = stats.count(endpoint, records) if stats is not None else 0
+            kept = False
+            if paused or breaker.policy == "buffer":
+                kept = self._spool(endpoint, records, None, None, count)
+            if not paused:
+                breaker.skipped += 1
+            if stats is not None:
+                stats.record_export(endpoint, count, False, kept, attempted=False)
+            return
+        headers = {'Content-Type': self._content_type}
+        body = None
+        if not self.streaming:
+            body = self._encode_body(endpoint, records, headers)
+        transport = self.transport
+        if getattr(transport, "deferred", False):
+            # Sent later by a background task, which reports the outcome through _export_result()
+            transport.submit(endpoint, body, headers, stats.count(endpoint, records) if stats is not None else 0)
+            return
+        if stats is not None:
+            started = ticks_us()
         try:
-            response = urequests.post(url, data=json_data, headers=headers)
-            print("Raw response content:", getattr(response, "content", "(no .content property)"))
-            print("Response:", response.status_code, response.text)
-            response.close()
+            if self.streaming:
+                envelope = self._envelope(endpoint)
+                if self.compression is not None:
+                    # The size is unknown up front, so the threshold does not apply here
+                    headers['Content-Encoding'] = self.compression
+                status = transport.send_stream(
+                    endpoint, lambda stream: self._write_body(envelope, records, stream), headers)
+            else:
+                status = transport.send(endpoint, body, headers)
         except Exception as e:
-            print("❌ Failed to send data (during HTTP POST):", e)
-            import sys
-            sys.print_exception(e)
+            self._export_result(endpoint, records, 0, body, headers, e)
+            return
+        self._export_result(endpoint, records, 0, body, headers, status,
+                            ticks_diff(ticks_us(), started) if stats is not None else None)
+
+    def _export_result(self, endpoint, records, count, body, headers, status, latency_us=None):
+        """Account for one export attempt; `status` is the HTTP status or the exception raised while sending.
+
+        A transport that sends from a background task (AsyncExporter) calls
+        this once the request is done, with `records` None and the record
+        `count` it was given. Failures are retried like any other export.
+        """
+        stats = self._stats
+        breaker = self.circuit_breaker
+        if stats is not None:
+            stats.export_attempts += 1
+            if records is not None:
+                count = stats.count(endpoint, records)
+            if latency_us is not None:
+                stats.record_latency(latency_us)
+                if body is not None:
+                    stats.bytes_sent += len(body)
+        if isinstance(status, Exception):
+            if breaker is None or not breaker.is_open:
+                # One line per outage; the breaker reports when it is over
+                print("❌ Failed to send data to", endpoint + ":", repr(status))
+        elif status in RETRYABLE_STATUS:
+            print("⚠️  Collector unavailable for", endpoint, "with HTTP status", status)
+        else:
+            if breaker is not None:
+                breaker.record_success()
+            delivered = 200 <= status < 300
+            if not delivered:
+                print("⚠️  Collector rejected", endpoint, "with HTTP status", status)
+            if stats is not None:
+                stats.record_export(endpoint, count, delivered)
+            if delivered and self.persistent_queue is not None and self.persistent_queue.size:
+                # The collector is reachable again, catch up on what was stored while it wasn't
+                self.replay_queue()
+            return
+        if breaker is not None:
+            breaker.record_failure()
+        kept = self._spool(endpoint, records, body, headers, count)
+        if stats is not None:
+            stats.record_export(endpoint, count, False, kept)
+
+    def _dropped(self, endpoint, count):
+        # A request held for a retry is lost for good: its records count as dropped
+        if self._stats is not None:
+            self._stats.record_export(endpoint, count, False, attempted=False)
+
+    def _spool(self, endpoint, records, body, headers, count):
+        spool = self._sleep_spool
+        if spool is None and self.persistent_queue is None and not self.max_retry_requests:
+            return False
+        if body is None:
+            # Streamed or skipped requests were never materialised; encode them for storage
+            headers = {'Content-Type': self._content_type}
+            body = self._encode_body(endpoint, records, headers)
+        if spool is not None:
+            # prepare_for_sleep() is running: keep it for the sleep store
+            spool.append((endpoint, body, headers, count))
+            return True
+        if self.persistent_queue is not None:
+            return self.persistent_queue.put(endpoint, body, headers, count)
+        requests = self._retry_requests
+        requests.append((endpoint, body, headers, count))
+        if len(requests) > self.max_retry_requests:
+            # Keep the newest; the oldest has been retried the longest
+            old_endpoint, _, _, old_count = requests.pop(0)
+            self.retry_dropped += 1
+            self._dropped(old_endpoint, old_count)
+        return True
+
+    def _resend(self, endpoint, body, headers, count=0):
+        """Send a request held for a retry; returns False to keep it for later.
+
+        Once it is delivered or rejected for good, its `count` records are
+        counted as exported or dropped.
+        """
+        transport = self.transport
+        if getattr(transport, "deferred", False):
+            # Handed over unless the background queue is full; the outcome comes back through _export_result()
+            return transport.submit(endpoint, body, headers, count, evict=False)
+        stats = self._stats
+        if stats is not None:
+            stats.export_attempts += 1
+            started = ticks_us()
+        breaker = self.circuit_breaker
+        try:
+            status = self.transport.send(endpoint, body, headers)
+        except Exception as e:
+            print("❌ Failed to replay queued data:", repr(e))
+            if stats is not None:
+                stats.export_failures += 1
+            if breaker is not None:
+                breaker.record_failure()
+            return False
+        if stats is not None:
+            stats.record_latency(ticks_diff(ticks_us(), started))
+            stats.bytes_sent += len(body)
+        if status in RETRYABLE_STATUS:
+            if stats is not None:
+                stats.export_failures += 1
+            if breaker is not None:
+                breaker.record_failure()
+            return False
+        if breaker is not None:
+            breaker.record_success()
+        if stats is not None:
+            stats.record_export(endpoint, count, 200 <= status < 300)
+        return True
+
+    def replay_queue(self):
+        """Send requests stored in the persistent queue; returns how many were sent."""
+        if self.persistent_queue is None:
+            return 0
+        if self.circuit_breaker is not None and not self.circuit_breaker.ready():
+            return 0
+        return self.persistent_queue.replay(self._resend)
@@ -0,0 +1,510 @@
+import math
+from array import array
+from opentelemetry_client import (ticks_ms, ticks_us, ticks_diff, bind_attributes, Attributes,
+                                  attribute_items, attribute_items_key, _bound_attributes)
+
+# OTLP AggregationTemporality values
+DELTA = 1
+CUMULATIVE = 2
+
+DEFAULT_HISTOGRAM_BOUNDARIES = [0, 5, 10, 25, 50, 75, 100, 250, 500, 750, 1000, 2500, 5000, 7500, 10000]
+
+# OTLP limits and SDK defaults for exponential histograms
+MAX_EXPONENTIAL_SCALE = 20
+MIN_EXPONENTIAL_SCALE = -10
+DEFAULT_EXPONENTIAL_MAX_SIZE = 160
+
+# Most MicroPython ports have single-precision floats, whose 24-bit mantissa
+# can't place values in buckets much finer than this
+FLOAT32 = 1.0 + 2.0 ** -30 == 1.0
+MAX_FLOAT32_SCALE = 16
+
+_LN2 = math.log(2)
+# How close to a bucket boundary (as a fraction of the bucket) a logarithm is checked against the boundary
+_EDGE = 0.05
+
+def attributes_key(attributes):
+    """Series key: a bound Attributes handle itself (found by identity), otherwise a tuple of the typed items.
+
+    A dict or list that matches a bound set shares that set's series. Others
+    are not interned, so their series are freed when a DELTA meter resets.
+    """
+    if isinstance(attributes, Attributes):
+        return attributes
+    key = attribute_items_key(attribute_items(attributes))
+    return _bound_attributes.get(key, key)
+
+def _number_point(value):
+    if isinstance(value, float):
+        return "asDouble", value
+    return "asInt", value
+
+def point_count(metrics):
+    """Number of data points in a list of OTLP metrics."""
+    n = 0
+    for metric in metrics:
+        for kind in ("gauge", "sum", "histogram", "exponentialHistogram"):
+            if kind in metric:
+                n += len(metric[kind]["dataPoints"])
+    return n
+
+def _bucket_index(boundaries, value):
+    # Buckets are (-inf, b0], (b0, b1], ..., (bN, +inf)
+    lo, hi = 0, len(boundaries)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if value <= boundaries[mid]:
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+class _Instrument:
+    def __init__(self, meter, name, unit="", description=""):
+        self.meter = meter
+        self.name = name
+        self.unit = unit
+        self.description = description
+        self._points = {}
+        self._starts = {}
+        # Series key -> Attributes, for the data points' OTLP attributes
+        self._attributes = {}
+
+    def _new_series(self, key, attributes):
+        self._attributes[key] = key if isinstance(key, Attributes) else Attributes(attribute_items(attributes))
+        if self.meter.temporality == CUMULATIVE:
+            self._starts[key] = self.meter.client._now_unix_nano()
+
+    def _start_time(self, key):
+        if self.meter.temporality == CUMULATIVE:
+            return self._starts[key]
+        return self.meter._last_collect_ns
+
+    def _metric(self):
+        return {"name": self.name, "unit": self.unit, "description": self.description}
+
+    def _reset(self):
+        if self.meter.temporality == DELTA:
+            self._points = {}
+            self._attributes = {}
+
+class _Sum(_Instrument):
+    monotonic = True
+
+    def _add(self, value, attributes):
+        key = attributes_key(attributes)
+        points = self._points
+        if key in points:
+            points[key] += value
+        else:
+            points[key] = value
+            self._new_series(key, attributes)
+
+    def _collect(self, now):
+        if not self._points:
+            return None
+        data_points = []
+        for key, value in self._points.items():
+            field, value = _number_point(value)
+            data_points.append({
+                "startTimeUnixNano": self._start_time(key),
+                "timeUnixNano": now,
+                "attributes": self._attributes[key].otlp,
+                field: value
+            })
+        metric = self._metric()
+        metric["sum"] = {
+            "dataPoints": data_points,
+            "isMonotonic": self.monotonic,
+            "aggregationTemporality": self.meter.temporality
+        }
+        self._reset()
+        return metric
+
+class Counter(_Sum):
+    def add(self, value, attributes=None):
+        if value < 0:
+            print(f"⚠️  Warning: Counter {self.name} can only increase, ignoring {value}")
+            return
+        self._add(value, attributes)
+
+class UpDownCounter(_Sum):
+    monotonic = False
+
+    def add(self, value, attributes=None):
+        self._add(value, attributes)
+
+class Histogram(_Instrument):
+    def __init__(self, meter, name, unit="", description="", boundaries=None):
+        super().__init__(meter, name, unit, description)
+        self.boundaries = boundaries if boundaries is not None else DEFAULT_HISTOGRAM_BOUNDARIES
+
+    def record(self, value, attributes=None):
+        key = attributes_key(attributes)
+        # [count, sum, min, max, bucketCounts]
+        point = self._points.get(key)
+        if point is None:
+            point = self._points[key] = [0, 0, value, value, [0] * (len(self.boundaries) + 1)]
+            self._new_series(key, attributes)
+        point[0] += 1
+        point[1] += value
+        if value < point[2]:
+            point[2] = value
+        if value > point[3]:
+            point[3] = value
+        point[4][_bucket_index(self.boundaries, value)] += 1
+
+    def _collect(self, now):
+        if not self._points:
+            return None
+        data_points = []
+        for key, (count, total, min_value, max_value, bucket_counts) in self._points.items():
+            data_points.append({
+                "startTimeUnixNano": self._start_time(key),
+                "timeUnixNano": now,
+                "attributes": self._attributes[key].otlp,
+                "count": count,
+                "sum": total,
+                "min": min_value,
+                "max": max_value,
+                "bucketCounts": list(bucket_counts),
+                "explicitBounds": self.boundaries
+            })
+        metric = self._metric()
+        metric["histogram"] = {
+            "dataPoints": data_points,
+            "aggregationTemporality": self.meter.temporality
+        }
+        self._reset()
+        return metric
+
+def exponential_index(value, scale):
+    """Index of the base-2**(2**-scale) bucket (base**i, base**(i+1)] holding `value` > 0."""
+    mantissa, exponent = math.frexp(value)
+    if scale <= 0:
+        # value is in [2**(exponent-1), 2**exponent); an exact power of two closes the bucket below
+        return (exponent - 1 - (mantissa == 0.5)) >> -scale
+    if mantissa == 0.5:
+        return ((exponent - 1) << scale) - 1
+    # value = m * 2**(exponent-1) with m in (1, 2): the power of two is exact, and only log2(m)
+    # is computed, so the rounding error stays below one bucket at any magnitude
+    m = mantissa * 2
+    size = 1 << scale
+    x = math.log(m) * size / _LN2
+    sub = int(x)
+    # Near a boundary the logarithm may be on the wrong side of it; the boundary decides
+    if x - sub < _EDGE:
+        if m <= math.pow(2.0, sub / size):
+            sub -= 1
+    elif x - sub > 1 - _EDGE:
+        if m > math.pow(2.0, (sub + 1) / size):
+            sub += 1
+    return ((exponent - 1) << scale) + sub
+
+class _ExponentialBuckets:
+    """Counts for a contiguous range of bucket indexes in a fixed array('I')."""
+    def __init__(self, size):
+        self.counts = array("I", bytes(4 * size))
+        # Index stored in counts[0], and the lowest/highest index that has a count
+        self.offset = 0
+        self.low = None
+        self.high = None
+
+    def change_needed(self, index, size):
+        # How far the scale must drop for the range to include `index` in `size` buckets
+        if self.low is None:
+            return 0
+        low = min(self.low, index)
+        high = max(self.high, index)
+        change = 0
+        while (high >> change) - (low >> change) >= size:
+            change += 1
+        return change
+
+    def downscale(self, change):
+        if self.low is None or not change:
+            return
+        counts = self.counts
+        offset = self.offset
+        new_offset = self.low >> change
+        # Merged positions never move right of where they were, so this works in place
+        for index in range(self.low, self.high + 1):
+            old = index - offset
+            value = counts[old]
+            if value:
+                counts[old] = 0
+                counts[(index >> change) - new_offset] += value
+        self.offset = new_offset
+        self.low >>= change
+        self.high >>= change
+
+    def increment(self, index):
+        counts = self.counts
+        size = len(counts)
+        if self.low is None:
+            self.offset = self.low = self.high = index
+        elif index < self.offset or index >= self.offset + size:
+            # Slide the window so both the old range and the new index fit
+            new_offset = index if index < self.offset else index - size + 1
+            shift = self.offset - new_offset
+            used = range(self.low - self.offset, self.high - self.offset + 1)
+            for old in (reversed(used) if shift > 0 else used):
+                value = counts[old]
+                counts[old] = 0
+                counts[old + shift] = value
+            self.offset = new_offset
+        if index < self.low:
+            self.low = index
+        if index > self.high:
+            self.high = index
+        counts[index - self.offset] += 1
+
+    def otlp(self):
+        if self.low is None:
+            return {"offset": 0, "bucketCounts": []}
+        return {"offset": self.low, "bucketCounts": list(self.counts[self.low - self.offset:self.high - self.offset + 1])}
+
+class ExponentialHistogram(_Instrument):
+    """Histogram with base-2 exponential buckets that rescale themselves to fit the recorded range.
+
+    Each series starts at `max_scale` (finest buckets) and halves its resolution
+    whenever the values would need more than `max_size` buckets, so no
+    boundaries have to be chosen up front. Counts are kept in array('I'),
+    fixed at 4 * max_size bytes per sign per series. On ports with
+    single-precision floats, `max_scale` is capped at 16.
+    """
+    def __init__(self, meter, name, unit="", description="", max_size=DEFAULT_EXPONENTIAL_MAX_SIZE, max_scale=MAX_EXPONENTIAL_SCALE):
+        super().__init__(meter, name, unit, description)
+        # The whole float range takes 3 buckets at the minimum scale
+        if max_size < 3:
+            raise ValueError("max_size must be at least 3")
+        self.max_size = max_size
+        self.max_scale = min(max_scale, MAX_FLOAT32_SCALE if FLOAT32 else MAX_EXPONENTIAL_SCALE)
+
+    def record(self, value, attributes=None):
+        key = attributes_key(attributes)
+        # [count, sum, min, max, zero count, scale, positive, negative]
+        point = self._points.get(key)
+        if point is None:
+            point = self._points[key] = [0, 0, value, value, 0, self.max_scale, None, None]
+            self._new_series(key, attributes)
+        point[0] += 1
+        point[1] += value
+        if value < point[2]:
+            point[2] = value
+        if value > point[3]:
+            point[3] = value
+        if value == 0:
+            point[4] += 1
+            return
+        slot = 6 if value > 0 else 7
+        buckets = point[slot]
+        if buckets is None:
+            buckets = point[slot] = _ExponentialBuckets(self.max_size)
+        magnitude = abs(value)
+        index = exponential_index(magnitude, point[5])
+        change = buckets.change_needed(index, self.max_size)
+        if change:
+            if point[5] - change < MIN_EXPONENTIAL_SCALE:
+                change = point[5] - MIN_EXPONENTIAL_SCALE
+            # Positive and negative ranges share one scale
+            point[5] -= change
+            for side in (point[6], point[7]):
+                if side is not None:
+                    side.downscale(change)
+            index = exponential_index(magnitude, point[5])
+        buckets.increment(index)
+
+    def _collect(self, now):
+        if not self._points:
+            return None
+        data_points = []
+        for key, (count, total, min_value, max_value, zero_count, scale, positive, negative) in self._points.items():
+            data_point = {
+                "startTimeUnixNano": self._start_time(key),
+                "timeUnixNano": now,
+                "attributes": self._attributes[key].otlp,
+                "count": count,
+                "sum": total,
+                "min": min_value,
+                "max": max_value,
+                "scale": scale,
+                "zeroCount": zero_count,
+            }
+            if positive is not None:
+                data_point["positive"] = positive.otlp()
+            if negative is not None:
+                data_point["negative"] = negative.otlp()
+            data_points.append(data_point)
+        metric = self._metric()
+        metric["exponentialHistogram"] = {
+            "dataPoints": data_points,
+            "aggregationTemporality": self.meter.temporality
+        }
+        self._reset()
+        return metric
+
+class _Observable(_Instrument):
+    """An instrument whose readings come from `callback()`, called only when the meter collects.
+
+    The callback returns one number, a list of (value, attributes) pairs, or
+    None when there is nothing to report. How long it took is kept in
+    `callback_us` and `max_callback_us`.
+    """
+    def __init__(self, meter, name, callback, unit="", description=""):
+        super().__init__(meter, name, unit, description)
+        self.callback = callback
+        self.callback_us = 0
+        self.max_callback_us = 0
+
+    def _observe(self):
+        started = ticks_us()
+        try:
+            result = self.callback()
+        except Exception as e:
+            print("❌ Callback for", self.name, "failed:", repr(e))
+            result = None
+        self.callback_us = ticks_diff(ticks_us(), started)
+        if self.callback_us > self.max_callback_us:
+            self.max_callback_us = self.callback_us
+        if result is None:
+            return ()
+        if isinstance(result, (int, float)):
+            return ((result, None),)
+        return result
+
+class ObservableGauge(_Observable):
+    def _collect(self, now):
+        data_points = []
+        for value, attributes in self._observe():
+            field, value = _number_point(value)
+            data_points.append({
+                "timeUnixNano": now,
+                "attributes": self.meter.client.format_attributes(attributes or {}),
+                field: value
+            })
+        if not data_points:
+            return None
+        metric = self._metric()
+        metric["gauge"] = {"dataPoints": data_points}
+        return metric
+
+class ObservableCounter(_Observable):
+    """Observes a running total, e.g. bytes received since boot; DELTA temporality exports the change."""
+    monotonic = True
+
+    def _collect(self, now):
+        data_points = []
+        delta = self.meter.temporality == DELTA
+        for value, attributes in self._observe():
+            key = attributes_key(attributes)
+            previous = self._points.get(key)
+            if previous is None or (self.monotonic and value < previous):
+                # New series, or the source's total went back (e.g. a driver reset): start over
+                previous = None
+                self._new_series(key, attributes)
+            self._points[key] = value
+            if delta and previous is not None:
+                value -= previous
+            field, value = _number_point(value)
+            data_points.append({
+                "startTimeUnixNano": self._start_time(key),
+                "timeUnixNano": now,
+                "attributes": self._attributes[key].otlp,
+                field: value
+            })
+        if not data_points:
+            return None
+        metric = self._metric()
+        metric["sum"] = {
+            "dataPoints": data_points,
+            "isMonotonic": self.monotonic,
+            "aggregationTemporality": self.meter.temporality
+        }
+        return metric
+
+class ObservableUpDownCounter(ObservableCounter):
+    monotonic = False
+
+class Meter:
+    """Aggregates instrument readings in RAM and exports them together every `export_interval_ms`."""
+    def __init__(self, client, export_interval_ms=60000, temporality=CUMULATIVE):
+        if temporality not in (DELTA, CUMULATIVE):
+            raise ValueError("Unsupported temporality: %s" % temporality)
+        self.client = client
+        self.export_interval_ms = export_interval_ms
+        self.temporality = temporality
+        self.instruments = []
+        self._last_collect_ns = client._now_unix_nano()
+        self._last_export = ticks_ms()
+        client.meters.append(self)
+
+    def _register(self, instrument):
+        self.instruments.append(instrument)
+        return instrument
+
+    def create_counter(self, name, unit="", description=""):
+        return self._register(Counter(self, name, unit, description))
+
+    def create_up_down_counter(self, name, unit="", description=""):
+        return self._register(UpDownCounter(self, name, unit, description))
+
+    def create_histogram(self, name, unit="", description="", boundaries=None):
+        return self._register(Histogram(self, name, unit, description, boundaries))
+
+    def create_exponential_histogram(self, name, unit="", description="", max_size=DEFAULT_EXPONENTIAL_MAX_SIZE, max_scale=MAX_EXPONENTIAL_SCALE):
+        return self._register(ExponentialHistogram(self, name, unit, description, max_size, max_scale))
+
+    def create_observable_gauge(self, name, callback, unit="", description=""):
+        return self._register(ObservableGauge(self, name, callback, unit, description))
+
+    def create_observable_counter(self, name, callback, unit="", description=""):
+        return self._register(ObservableCounter(self, name, callback, unit, description))
+
+    def create_observable_up_down_counter(self, name, callback, unit="", description=""):
+        return self._register(ObservableUpDownCounter(self, name, callback, unit, description))
+
+    def collect(self):
+        """Run every observable callback, back to back, and return all series as OTLP metrics."""
+        now = self.client._now_unix_nano()
+        metrics = []
+        for instrument in self.instruments:
+            metric = instrument._collect(now)
+            if metric is not None:
+                metrics.append(metric)
+        self._last_collect_ns = now
+        stats = self.client._stats
+        if stats is not None:
+            durations = self._callback_durations(now)
+            if durations is not None:
+                metrics.append(durations)
+            stats.points_created += point_count(metrics)
+        return metrics
+
+    def _callback_durations(self, now):
+        # With self-telemetry on, how long each callback took this cycle, to find slow sensors
+        data_points = []
+        for instrument in self.instruments:
+            if isinstance(instrument, _Observable):
+                data_points.append({
+                    "timeUnixNano": now,
+                    "attributes": bind_attributes({"instrument.name": instrument.name}).otlp,
+                    "asInt": instrument.callback_us
+                })
+        if not data_points:
+            return None
+        return {"name": "otel.client.callback.duration", "unit": "us", "gauge": {"dataPoints": data_points}}
+
+    def poll(self):
+        # Readings keep aggregating while exports are paused, so waiting loses nothing
+        if ticks_diff(ticks_ms(), self._last_export) >= self.export_interval_ms and self.client._export_ready():
+            self.flush()
+
+    def flush(self):
+        self._last_export = ticks_ms()
+        metrics = self.collect()
+        if metrics:
+            self.client._export_metrics(metrics)
+
+    def shutdown(self):
+        self.flush()
@@ -0,0 +1,333 @@
+"""OTLP protobuf encoding of the records built by OpenTelemetryClient.
+
+Only the subset of the OTLP schema the client produces is covered. Messages are
+written by hand with varints, fixed64 timestamps and raw byte IDs, so no
+protobuf runtime is needed on the device.
+"""
+try:
+    import ustruct as struct
+except ImportError:
+    import struct
+
+try:
+    from ubinascii import unhexlify
+except ImportError:
+    from binascii import unhexlify
+
+CONTENT_TYPE = "application/x-protobuf"
+
+_VARINT = 0
+_FIXED64 = 1
+_LEN = 2
+_FIXED32 = 5
+
+def _varint(out, n):
+    if n < 0:
+        n &= 0xFFFFFFFFFFFFFFFF
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+def _tag(out, field, wire_type):
+    _varint(out, (field << 3) | wire_type)
+
+def _uint(out, field, n):
+    if n:
+        _tag(out, field, _VARINT)
+        _varint(out, n)
+
+def _sint(out, field, n):
+    if n:
+        _tag(out, field, _VARINT)
+        _varint(out, (n << 1) ^ (n >> 63))
+
+def _fixed64(out, field, n):
+    if n:
+        _tag(out, field, _FIXED64)
+        out.extend(struct.pack("<Q", int(n)))
+
+def _sfixed64(out, field, n):
+    _tag(out, field, _FIXED64)
+    out.extend(struct.pack("<q", int(n)))
+
+def _fixed32(out, field, n):
+    if n:
+        _tag(out, field, _FIXED32)
+        out.extend(struct.pack("<I", n))
+
+def _double(out, field, x):
+    _tag(out, field, _FIXED64)
+    out.extend(struct.pack("<d", x))
+
+def _bytes(out, field, data):
+    if data:
+        _tag(out, field, _LEN)
+        _varint(out, len(data))
+        out.extend(data)
+
+def _string(out, field, s):
+    if s:
+        _bytes(out, field, s.encode() if isinstance(s, str) else s)
+
+def _id(out, field, value):
+    # IDs travel as raw 16/8 byte strings rather than hex text
+    if value:
+        _bytes(out, field, unhexlify(value) if isinstance(value, str) else value)
+
+def _message(out, field, encode, obj):
+    sub = bytearray()
+    encode(sub, obj)
+    _tag(out, field, _LEN)
+    _varint(out, len(sub))
+    out.extend(sub)
+
+def _packed_fixed64(out, field, values):
+    if values:
+        _tag(out, field, _LEN)
+        _varint(out, 8 * len(values))
+        for v in values:
+            out.extend(struct.pack("<Q", int(v)))
+
+def _packed_double(out, field, values):
+    if values:
+        _tag(out, field, _LEN)
+        _varint(out, 8 * len(values))
+        for v in values:
+            out.extend(struct.pack("<d", v))
+
+def _packed_varint(out, field, values):
+    if values:
+        sub = bytearray()
+        for v in values:
+            _varint(sub, v)
+        _bytes(out, field, sub)
+
+# --- common ---
+
+def _any_value(out, value):
+    if "stringValue" in value:
+        # An empty string is still a set oneof field
+        s = value["stringValue"]
+        s = s.encode() if isinstance(s, str) else s
+        _tag(out, 1, _LEN)
+        _varint(out, len(s))
+        out.extend(s)
+    elif "boolValue" in value:
+        _tag(out, 2, _VARINT)
+        _varint(out, 1 if value["boolValue"] else 0)
+    elif "intValue" in value:
+        _tag(out, 3, _VARINT)
+        _varint(out, int(value["intValue"]))
+    elif "doubleValue" in value:
+        _double(out, 4, value["doubleValue"])
+    elif "arrayValue" in value:
+        _message(out, 5, _array_value, value["arrayValue"])
+    elif "kvlistValue" in value:
+        _message(out, 6, _array_value_kv, value["kvlistValue"])
+    elif "bytesValue" in value:
+        _bytes(out, 7, value["bytesValue"])
+
+def _array_value(out, array):
+    for v in array.get("values", ()):
+        _message(out, 1, _any_value, v)
+
+def _array_value_kv(out, kvlist):
+    for kv in kvlist.get("values", ()):
+        _message(out, 1, _key_value, kv)
+
+def _key_value(out, kv):
+    _string(out, 1, kv["key"])
+    _message(out, 2, _any_value, kv["value"])
+
+def _attributes(out, field, attributes):
+    for kv in attributes or ():
+        _message(out, field, _key_value, kv)
+
+def _resource(out, resource):
+    _attributes(out, 1, resource.get("attributes"))
+
+def _scope(out, scope):
+    _string(out, 1, scope.get("name"))
+    _string(out, 2, scope.get("version"))
+
+# --- traces ---
+
+def _event(out, event):
+    _fixed64(out, 1, event.get("timeUnixNano"))
+    _string(out, 2, event.get("name"))
+    _attributes(out, 3, event.get("attributes"))
+
+def _status(out, status):
+    _string(out, 2, status.get("message"))
+    _uint(out, 3, status.get("code", 0))
+
+def _span(out, span):
+    _id(out, 1, span.get("traceId"))
+    _id(out, 2, span.get("spanId"))
+    _string(out, 3, span.get("traceState"))
+    _id(out, 4, span.get("parentSpanId"))
+    _string(out, 5, span.get("name"))
+    _uint(out, 6, span.get("kind", 0))
+    _fixed64(out, 7, span.get("startTimeUnixNano"))
+    _fixed64(out, 8, span.get("endTimeUnixNano"))
+    _attributes(out, 9, span.get("attributes"))
+    for event in span.get("events", ()):
+        _message(out, 11, _event, event)
+    if "status" in span:
+        _message(out, 15, _status, span["status"])
+    _fixed32(out, 16, span.get("flags", 0))
+
+# --- metrics ---
+
+def _number_point(out, point):
+    _fixed64(out, 2, point.get("startTimeUnixNano"))
+    _fixed64(out, 3, point.get("timeUnixNano"))
+    if "asDouble" in point:
+        _double(out, 4, point["asDouble"])
+    else:
+        _sfixed64(out, 6, point.get("asInt", 0))
+    _attributes(out, 7, point.get("attributes"))
+
+def _histogram_point(out, point):
+    _fixed64(out, 2, point.get("startTimeUnixNano"))
+    _fixed64(out, 3, point.get("timeUnixNano"))
+    _tag(out, 4, _FIXED64)
+    out.extend(struct.pack("<Q", int(point.get("count", 0))))
+    if "sum" in point:
+        _double(out, 5, point["sum"])
+    _packed_fixed64(out, 6, point.get("bucketCounts"))
+    _packed_double(out, 7, point.get("explicitBounds"))
+    _attributes(out, 9, point.get("attributes"))
+    if "min" in point:
+        _double(out, 11, point["min"])
+    if "max" in point:
+        _double(out, 12, point["max"])
+
+def _buckets(out, buckets):
+    _sint(out, 1, buckets.get("offset", 0))
+    _packed_varint(out, 2, buckets.get("bucketCounts"))
+
+def _exponential_histogram_point(out, point):
+    _attributes(out, 1, point.get("attributes"))
+    _fixed64(out, 2, point.get("startTimeUnixNano"))
+    _fixed64(out, 3, point.get("timeUnixNano"))
+    _tag(out, 4, _FIXED64)
+    out.extend(struct.pack("<Q", int(point.get("count", 0))))
+    if "sum" in point:
+        _double(out, 5, point["sum"])
+    _sint(out, 6, point.get("scale", 0))
+    _fixed64(out, 7, point.get("zeroCount"))
+    if "positive" in point:
+        _message(out, 8, _buckets, point["positive"])
+    if "negative" in point:
+        _message(out, 9, _buckets, point["negative"])
+    if "min" in point:
+        _double(out, 12, point["min"])
+    if "max" in point:
+        _double(out, 13, point["max"])
+
+def _points(point_encoder):
+    def encode(out, body):
+        for point in body.get("dataPoints", ()):
+            _message(out, 1, point_encoder, point)
+        _uint(out, 2, body.get("aggregationTemporality", 0))
+        if body.get("isMonotonic"):
+            _tag(out, 3, _VARINT)
+            out.append(1)
+    return encode
+
+_gauge = _points(_number_point)
+_sum = _gauge
+_histogram = _points(_histogram_point)
+_exponential_histogram = _points(_exponential_histogram_point)
+
+def _metric(out, metric):
+    _string(out, 1, metric.get("name"))
+    _string(out, 2, metric.get("description"))
+    _string(out, 3, metric.get("unit"))
+    if "gauge" in metric:
+        _message(out, 5, _gauge, metric["gauge"])
+    elif "sum" in metric:
+        _message(out, 7, _sum, metric["sum"])
+    elif "histogram" in metric:
+        _message(out, 9, _histogram, metric["histogram"])
+    elif "exponentialHistogram" in metric:
+        _message(out, 10, _exponential_histogram, metric["exponentialHistogram"])
+
+# --- logs ---
+
+def _log_record(out, record):
+    _fixed64(out, 1, record.get("timeUnixNano"))
+    _uint(out, 2, record.get("severityNumber", 0))
+    _string(out, 3, record.get("severityText"))
+    if "body" in record:
+        _message(out, 5, _any_value, record["body"])
+    _attributes(out, 6, record.get("attributes"))
+    _fixed32(out, 8, record.get("flags", 0))
+    _id(out, 9, record.get("traceId"))
+    _id(out, 10, record.get("spanId"))
+    _fixed64(out, 11, record.get("observedTimeUnixNano"))
+
+_RECORD_ENCODERS = {
+    "/v1/traces": _span,
+    "/v1/metrics": _metric,
+    "/v1/logs": _log_record,
+}
+
+def envelope(endpoint, resource_attributes, scope):
+    """Pre-encode the resource and scope fields shared by every request to `endpoint`."""
+    resource = bytearray()
+    _message(resource, 1, _resource, {"attributes": resource_attributes})
+    scope_field = bytearray()
+    _message(scope_field, 1, _scope, scope)
+    return bytes(resource), bytes(scope_field), _RECORD_ENCODERS[endpoint]
+
+def encode_records(envelope, records):
+    resource, scope_field, encode_record = envelope
+    # Resource*/Scope* messages share field numbers across all three signals
+    scoped = bytearray(scope_field)
+    for record in records:
+        _message(scoped, 2, encode_record, record)
+    resourced = bytearray(resource)
+    _bytes(resourced, 2, scoped)
+    out = bytearray()
+    _bytes(out, 1, resourced)
+    return out
+
+def _write_group(stream, resource, scope_field, group, group_len):
+    scope_len = len(scope_field) + group_len
+    head = bytearray()
+    _tag(head, 2, _LEN)
+    _varint(head, scope_len)
+    resource_len = len(resource) + len(head) + scope_len
+    outer = bytearray()
+    _tag(outer, 1, _LEN)
+    _varint(outer, resource_len)
+    stream.write(outer)
+    stream.write(resource)
+    stream.write(head)
+    stream.write(scope_field)
+    for record in group:
+        stream.write(record)
+
+def stream_records(envelope, records, stream, group_size=512):
+    """Write the request for `records` to `stream` holding at most ~`group_size` encoded bytes at once.
+
+    Records are grouped into repeated Resource*/Scope* messages that share the
+    cached envelope; receivers merge them back into one resource.
+    """
+    resource, scope_field, encode_record = envelope
+    group = []
+    group_len = 0
+    for record in records:
+        encoded = bytearray()
+        _message(encoded, 2, encode_record, record)
+        if group and group_len + len(encoded) > group_size:
+            _write_group(stream, resource, scope_field, group, group_len)
+            group = []
+            group_len = 0
+        group.append(encoded)
+        group_len += len(encoded)
+    if group:
+        _write_group(stream, resource, scope_field, group, group_len)
@@ -0,0 +1,147 @@
+import os
+
+try:
+    import ustruct as struct
+except ImportError:
+    import struct
+
+_HEADER = "<HI"
+_HEADER_SIZE = 6
+_SUFFIX = ".seg"
+
+def encode_meta(path, count, headers):
+    """The path, record count and headers of a stored request, one per line."""
+    meta = "%s %d" % (path, count) if count else path
+    for key, value in (headers or {}).items():
+        meta += f"\n{key}: {value}"
+    return meta.encode()
+
+def decode_meta(meta):
+    """Return (path, count, headers); requests stored without a count have 0."""
+    lines = bytes(meta).decode().split("\n")
+    path, _, count = lines[0].partition(" ")
+    headers = {}
+    for line in lines[1:]:
+        key, _, value = line.partition(": ")
+        headers[key] = value
+    return path, int(count) if count else 0, headers
+
+class PersistentQueue:
+    """On-flash queue of encoded export requests that could not be delivered.
+
+    Requests are appended to numbered segment files and never rewritten in
+    place; a segment is only deleted once everything in it has been replayed,
+    or when the queue is over `max_bytes` and the oldest segment is evicted.
+    The replay position inside the oldest segment is kept in RAM, so after a
+    reboot a partly replayed segment is sent again from the start.
+
+    Each request carries the number of records in it. If `on_evict` is set,
+    it is called as `on_evict(path, count)` for every request lost to eviction.
+    """
+    def __init__(self, directory="otel_queue", max_bytes=65536, segment_bytes=8192):
+        if segment_bytes > max_bytes:
+            raise ValueError("segment_bytes must not be larger than max_bytes")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self.evicted_segments = 0
+        self.on_evict = None
+        try:
+            os.mkdir(directory)
+        except OSError:
+            pass
+        # [segment id, size in bytes], oldest first
+        self._segments = []
+        for name in os.listdir(directory):
+            if name.endswith(_SUFFIX):
+                seg_id = int(name[:-len(_SUFFIX)])
+                self._segments.append([seg_id, os.stat(self._name(seg_id))[6]])
+        self._segments.sort()
+        self.size = sum(size for _, size in self._segments)
+        self._next_id = self._segments[-1][0] + 1 if self._segments else 1
+        self._read_offset = 0
+
+    def _name(self, seg_id):
+        return "%s/%08d%s" % (self.directory, seg_id, _SUFFIX)
+
+    def put(self, path, body, headers=None, count=0):
+        if isinstance(body, str):
+            body = body.encode()
+        meta = encode_meta(path, count, headers)
+        record_size = _HEADER_SIZE + len(meta) + len(body)
+        if record_size > self.max_bytes:
+            print("⚠️  Export of", record_size, "bytes is larger than the whole queue, dropping it.")
+            return False
+        # A request bigger than segment_bytes gets a segment of its own
+        if not self._segments or (self._segments[-1][1] and self._segments[-1][1] + record_size > self.segment_bytes):
+            self._segments.append([self._next_id, 0])
+            self._next_id += 1
+        tail = self._segments[-1]
+        # One append per request: no index file to update, no block rewritten in place
+        with open(self._name(tail[0]), "ab") as f:
+            f.write(struct.pack(_HEADER, len(meta), len(body)) + meta + body)
+        tail[1] += record_size
+        self.size += record_size
+        while self.size > self.max_bytes and len(self._segments) > 1:
+            if self.on_evict is not None:
+                self._report_evicted()
+            self._remove_oldest()
+            self.evicted_segments += 1
+        return True
+
+    def _remove_oldest(self):
+        seg_id, size = self._segments.pop(0)
+        try:
+            os.remove(self._name(seg_id))
+        except OSError:
+            pass
+        self.size -= size
+        self._read_offset = 0
+
+    def _report_evicted(self):
+        # Only what hasn't been replayed yet; bodies are skipped, not read
+        with open(self._name(self._segments[0][0]), "rb") as f:
+            f.seek(self._read_offset)
+            while True:
+                header = f.read(_HEADER_SIZE)
+                if len(header) < _HEADER_SIZE:
+                    break
+                meta_len, body_len = struct.unpack(_HEADER, header)
+                meta = f.read(meta_len)
+                if len(meta) < meta_len:
+                    break
+                path, count, _ = decode_meta(meta)
+                self.on_evict(path, count)
+                f.seek(body_len, 1)
+
+    def replay(self, send):
+        """Call `send(path, body, headers, count)` for queued requests, oldest first.
+
+        `send` returns True once a request is done with (delivered or rejected
+        for good) and False to stop and keep it for later. Returns the number of
+        requests consumed.
+        """
+        consumed = 0
+        while self._segments:
+            seg_id = self._segments[0][0]
+            with open(self._name(seg_id), "rb") as f:
+                f.seek(self._read_offset)
+                while True:
+                    header = f.read(_HEADER_SIZE)
+                    if len(header) < _HEADER_SIZE:
+                        break
+                    meta_len, body_len = struct.unpack(_HEADER, header)
+                    meta = f.read(meta_len)
+                    body = f.read(body_len)
+                    if len(body) < body_len:
+                        # Torn write from a power cut; nothing after it is usable
+                        break
+                    path, count, headers = decode_meta(meta)
+                    if not send(path, body, headers, count):
+                        return consumed
+                    self._read_offset = f.tell()
+                    consumed += 1
+            self._remove_oldest()
+            if not self._segments:
+                self._next_id = 1
+        return consumed
@@ -0,0 +1,108 @@
+from opentelemetry_client import ticks_ms, ticks_diff
+
+class Sampler:
+    """Decides in `start_trace` whether a new span is recorded.
+
+    `should_sample(trace_id, name, kind, parent_sampled)` gets the raw 16 byte
+    trace ID and `parent_sampled` as None for a root span, otherwise the
+    sampled flag of the parent. It returns a falsy value to drop the span, or
+    True (or a dict of extra span attributes) to record it. The base class
+    records every span; subclasses override `should_sample`.
+    """
+    def should_sample(self, trace_id, name, kind, parent_sampled):
+        return True
+
+class AlwaysOnSampler(Sampler):
+    """Record every span: the base behaviour, under its OTel name."""
+
+class AlwaysOffSampler(Sampler):
+    def should_sample(self, trace_id, name, kind, parent_sampled):
+        return False
+
+class TraceIdRatioSampler(Sampler):
+    """Record a fixed fraction of traces, decided from the trace ID alone.
+
+    Every service using the same ratio keeps or drops the same traces, so
+    sampled traces stay complete across devices.
+    """
+    def __init__(self, ratio):
+        if not 0 <= ratio <= 1:
+            raise ValueError("ratio must be between 0 and 1")
+        self.ratio = ratio
+        # Compared against the random low 8 bytes of the trace ID
+        self._bound = int(ratio * (1 << 64))
+
+    def should_sample(self, trace_id, name, kind, parent_sampled):
+        return int.from_bytes(trace_id[8:], "big") < self._bound
+
+class ParentBasedSampler(Sampler):
+    """Follow the parent's sampled flag, and use `root` for spans without a parent."""
+    def __init__(self, root, sampled_parent=None, unsampled_parent=None):
+        self.root = root
+        self.sampled_parent = sampled_parent if sampled_parent is not None else AlwaysOnSampler()
+        self.unsampled_parent = unsampled_parent if unsampled_parent is not None else AlwaysOffSampler()
+
+    def should_sample(self, trace_id, name, kind, parent_sampled):
+        if parent_sampled is None:
+            sampler = self.root
+        elif parent_sampled:
+            sampler = self.sampled_parent
+        else:
+            sampler = self.unsampled_parent
+        return sampler.should_sample(trace_id, name, kind, parent_sampled)
+
+# Attribute put on an admitted span: spans of the same name suppressed since the last admitted one
+SUPPRESSED_ATTRIBUTE = "sampling.suppressed_spans"
+
+class RateLimitingSampler(Sampler):
+    """Admit at most `spans_per_second` spans per span name, and `max_spans_per_second` overall.
+
+    Each name has a token bucket holding up to `burst` spans. Names beyond
+    `max_names` share one bucket so a loop generating unique names can't grow
+    the table. The number of spans a name had suppressed is recorded on its
+    next admitted span, so the real rate can be reconstructed downstream.
+    Wrap it in ParentBasedSampler to limit only root spans.
+    """
+    def __init__(self, spans_per_second=1, burst=None, max_spans_per_second=None, max_names=16):
+        self.spans_per_second = spans_per_second
+        self.max_spans_per_second = max_spans_per_second
+        self.max_names = max_names
+        # Tokens are kept in thousandths of a span, refilled by `rate` per millisecond
+        self._capacity = max(1, burst if burst is not None else spans_per_second) * 1000
+        self._global_capacity = max(1, max_spans_per_second or 0) * 1000
+        now = ticks_ms()
+        # name -> [tokens, last refill, suppressed]
+        self._buckets = {}
+        self._overflow = [self._capacity, now, 0]
+        self._global = [self._global_capacity, now]
+        self.suppressed = 0
+
+    def _refill(self, bucket, rate, capacity, now):
+        tokens = bucket[0] + ticks_diff(now, bucket[1]) * rate
+        bucket[0] = tokens if tokens < capacity else capacity
+        bucket[1] = now
+        return bucket[0] >= 1000
+
+    def should_sample(self, trace_id, name, kind, parent_sampled):
+        now = ticks_ms()
+        bucket = self._buckets.get(name)
+        if bucket is None:
+            if len(self._buckets) < self.max_names:
+                bucket = self._buckets[name] = [self._capacity, now, 0]
+            else:
+                bucket = self._overflow
+        admitted = self._refill(bucket, self.spans_per_second, self._capacity, now)
+        if admitted and self.max_spans_per_second is not None:
+            admitted = self._refill(self._global, self.max_spans_per_second, self._global_capacity, now)
+            if admitted:
+                self._global[0] -= 1000
+        if not admitted:
+            bucket[2] += 1
+            self.suppressed += 1
+            return False
+        bucket[0] -= 1000
+        suppressed = bucket[2]
+        if suppressed:
+            bucket[2] = 0
+            return {SUPPRESSED_ATTRIBUTE: {"intValue": suppressed}}
+        return True
@@ -0,0 +1,122 @@
+import os
+
+try:
+    import ustruct as struct
+except ImportError:
+    import struct
+
+from opentelemetry_queue import encode_meta, decode_meta
+
+# magic, clock at sleep (Unix ns), planned sleep (ms), last NTP sync (Unix s), number of requests
+_STATE = "<4sQIIH"
+_STATE_SIZE = 22
+_MAGIC = b"OTS1"
+# Per request, as in opentelemetry_queue: metadata length, body length, then the
+# metadata (path, record count, headers) and the body
+_RECORD = "<HI"
+_RECORD_SIZE = 6
+
+def encode_state(anchor_ns, sleep_ms, synced_s, requests, max_bytes):
+    """Pack the clock and as many (path, body, headers, count) requests as fit in `max_bytes`; returns (data, saved)."""
+    records = []
+    size = _STATE_SIZE
+    for path, body, headers, count in requests:
+        if isinstance(body, str):
+            body = body.encode()
+        meta = encode_meta(path, count, headers)
+        record_size = _RECORD_SIZE + len(meta) + len(body)
+        if size + record_size > max_bytes:
+            # Oldest first; a newer request that would fit is still left out so none is reordered
+            break
+        records.append(struct.pack(_RECORD, len(meta), len(body)) + meta + body)
+        size += record_size
+    head = struct.pack(_STATE, _MAGIC, anchor_ns, sleep_ms, synced_s, len(records))
+    return head + b"".join(records), len(records)
+
+def decode_state(data):
+    """Return (anchor_ns, sleep_ms, synced_s, requests), or None if `data` holds no complete state."""
+    if not data or len(data) < _STATE_SIZE:
+        return None
+    magic, anchor_ns, sleep_ms, synced_s, count = struct.unpack(_STATE, data[:_STATE_SIZE])
+    if magic != _MAGIC:
+        return None
+    requests = []
+    pos = _STATE_SIZE
+    for _ in range(count):
+        if pos + _RECORD_SIZE > len(data):
+            return None
+        meta_len, body_len = struct.unpack(_RECORD, data[pos:pos + _RECORD_SIZE])
+        pos += _RECORD_SIZE
+        if pos + meta_len + body_len > len(data):
+            return None
+        path, count, headers = decode_meta(data[pos:pos + meta_len])
+        pos += meta_len
+        requests.append((path, bytes(data[pos:pos + body_len]), headers, count))
+        pos += body_len
+    return anchor_ns, sleep_ms, synced_s, requests
+
+class SleepStore:
+    """Where `prepare_for_sleep` leaves the clock and unsent requests for the next wake.
+
+    A clock restored from the store is trusted for `resync_after_s` seconds
+    after the last NTP sync; until then the client skips `sync_time` on wake.
+    """
+    def __init__(self, max_bytes, resync_after_s=86400):
+        self.max_bytes = max_bytes
+        self.resync_after_s = resync_after_s
+        # Requests left out because the store was full
+        self.dropped = 0
+
+    def save(self, anchor_ns, sleep_ms, synced_s, requests):
+        """Store the state; returns how many requests fit."""
+        data, saved = encode_state(anchor_ns, sleep_ms, synced_s, requests, self.max_bytes)
+        self._write(data)
+        if saved < len(requests):
+            self.dropped += len(requests) - saved
+            print("⚠️ ", len(requests) - saved, "export requests did not fit in the sleep store, dropping them.")
+        return saved
+
+    def load(self):
+        return decode_state(self._read())
+
+    def clear(self):
+        self._write(b"")
+
+class RTCMemoryStore(SleepStore):
+    """Keep the state in RTC memory, which survives deep sleep but not a power cut.
+
+    The ESP32 port offers 2048 bytes, the ESP8266 492. Nothing is written to flash.
+    """
+    def __init__(self, max_bytes=2048, resync_after_s=86400):
+        super().__init__(max_bytes, resync_after_s)
+        import machine
+        self._rtc = machine.RTC()
+
+    def _read(self):
+        return self._rtc.memory()
+
+    def _write(self, data):
+        self._rtc.memory(data)
+
+class FileStore(SleepStore):
+    """Keep the state in a small file, for ports without RTC memory or to survive power loss."""
+    def __init__(self, path="otel_sleep.bin", max_bytes=8192, resync_after_s=86400):
+        super().__init__(max_bytes, resync_after_s)
+        self.path = path
+
+    def _read(self):
+        try:
+            with open(self.path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write(self, data):
+        if data:
+            with open(self.path, "wb") as f:
+                f.write(data)
+            return
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
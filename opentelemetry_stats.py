@@ -0,0 +1,154 @@
+from opentelemetry_client import ticks_ms, ticks_diff
+from opentelemetry_metrics import CUMULATIVE, _bucket_index, point_count
+
+# Export round trips in microseconds, from a LAN collector to a slow uplink
+DEFAULT_LATENCY_BOUNDARIES_US = [1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000, 500000, 1000000, 2500000]
+
+# stats() key -> (metric name, unit, monotonic sum or gauge)
+_METRICS = (
+    ("spans_created", "otel.client.spans.created", "{span}", True),
+    ("spans_exported", "otel.client.spans.exported", "{span}", True),
+    ("spans_dropped", "otel.client.spans.dropped", "{span}", True),
+    ("logs_created", "otel.client.logs.created", "{log}", True),
+    ("logs_exported", "otel.client.logs.exported", "{log}", True),
+    ("logs_dropped", "otel.client.logs.dropped", "{log}", True),
+    ("points_created", "otel.client.points.created", "{point}", True),
+    ("points_exported", "otel.client.points.exported", "{point}", True),
+    ("points_dropped", "otel.client.points.dropped", "{point}", True),
+    ("bytes_sent", "otel.client.bytes.sent", "By", True),
+    ("export_attempts", "otel.client.export.attempts", "{request}", True),
+    ("export_failures", "otel.client.export.failures", "{request}", True),
+    ("exports_skipped", "otel.client.export.skipped", "{request}", True),
+    ("span_queue_depth", "otel.client.queue.spans", "{span}", False),
+    ("log_queue_depth", "otel.client.queue.logs", "{log}", False),
+    ("pending_requests", "otel.client.queue.requests", "{request}", False),
+    ("pending_dropped", "otel.client.requests.dropped", "{request}", True),
+    ("persistent_queue_bytes", "otel.client.queue.persistent", "By", False),
+)
+
+class PipelineStats:
+    """Counters the client keeps about its own export pipeline.
+
+    Only created when the client is built with `self_telemetry=True`; until
+    then every call site skips the bookkeeping. With `export_interval_ms` set
+    the client also registers it as a meter, so the counters are exported as
+    OTLP metrics alongside the application's own.
+    """
+    def __init__(self, client, export_interval_ms=None, boundaries=None):
+        self.client = client
+        self.export_interval_ms = export_interval_ms
+        self.spans_created = 0
+        self.spans_exported = 0
+        self.spans_dropped = 0
+        self.logs_created = 0
+        self.logs_exported = 0
+        self.logs_dropped = 0
+        self.points_created = 0
+        self.points_exported = 0
+        self.points_dropped = 0
+        self.bytes_sent = 0
+        self.export_attempts = 0
+        self.export_failures = 0
+        self.boundaries = boundaries if boundaries is not None else DEFAULT_LATENCY_BOUNDARIES_US
+        # [count, sum, min, max, bucketCounts] like a Histogram point
+        self.latency = [0, 0, 0, 0, [0] * (len(self.boundaries) + 1)]
+        self._start_ns = client._now_unix_nano()
+        self._last_export = ticks_ms()
+
+    def record_latency(self, us):
+        latency = self.latency
+        if not latency[0] or us < latency[2]:
+            latency[2] = us
+        if us > latency[3]:
+            latency[3] = us
+        latency[0] += 1
+        latency[1] += us
+        latency[4][_bucket_index(self.boundaries, us)] += 1
+
+    def count(self, endpoint, records):
+        """Number of spans, logs or data points in `records`."""
+        if endpoint == "/v1/metrics":
+            return point_count(records)
+        return len(records)
+
+    def record_export(self, endpoint, n, delivered, kept=False, attempted=True):
+        """Account for the `n` records of one export request once its outcome is known."""
+        if not delivered:
+            if attempted:
+                self.export_failures += 1
+            if kept:
+                # Held for a retry: the records are counted once it is delivered or dropped
+                return
+        if endpoint == "/v1/traces":
+            if delivered:
+                self.spans_exported += n
+            else:
+                self.spans_dropped += n
+        elif endpoint == "/v1/logs":
+            if delivered:
+                self.logs_exported += n
+            else:
+                self.logs_dropped += n
+        else:
+            if delivered:
+                self.points_exported += n
+            else:
+                self.points_dropped += n
+
+    def update(self, stats):
+        stats["spans_created"] = self.spans_created
+        stats["spans_exported"] = self.spans_exported
+        stats["spans_dropped"] += self.spans_dropped
+        stats["logs_created"] = self.logs_created
+        stats["logs_exported"] = self.logs_exported
+        stats["logs_dropped"] += self.logs_dropped
+        stats["points_created"] = self.points_created
+        stats["points_exported"] = self.points_exported
+        stats["points_dropped"] = self.points_dropped
+        stats["bytes_sent"] = self.bytes_sent
+        stats["export_attempts"] = self.export_attempts
+        stats["export_failures"] = self.export_failures
+        count, total, min_us, max_us, buckets = self.latency
+        stats["export_latency_us"] = {
+            "count": count, "sum": total, "min": min_us, "max": max_us,
+            "bucketCounts": list(buckets), "explicitBounds": self.boundaries
+        }
+
+    def collect(self):
+        client = self.client
+        stats = client.stats()
+        now = client._now_unix_nano()
+        metrics = []
+        for key, name, unit, monotonic in _METRICS:
+            if key not in stats:
+                continue
+            point = {"timeUnixNano": now, "asInt": stats[key]}
+            metric = {"name": name, "unit": unit}
+            if monotonic:
+                point["startTimeUnixNano"] = self._start_ns
+                metric["sum"] = {"dataPoints": [point], "isMonotonic": True, "aggregationTemporality": CUMULATIVE}
+            else:
+                metric["gauge"] = {"dataPoints": [point]}
+            metrics.append(metric)
+        latency = stats["export_latency_us"]
+        if latency["count"]:
+            point = {"startTimeUnixNano": self._start_ns, "timeUnixNano": now}
+            point.update(latency)
+            metrics.append({
+                "name": "otel.client.export.duration",
+                "unit": "us",
+                "histogram": {"dataPoints": [point], "aggregationTemporality": CUMULATIVE}
+            })
+        self.points_created += len(metrics)
+        return metrics
+
+    def poll(self):
+        if ticks_diff(ticks_ms(), self._last_export) >= self.export_interval_ms and self.client._export_ready():
+            self.flush()
+
+    def flush(self):
+        self._last_export = ticks_ms()
+        self.client._export_metrics(self.collect())
+
+    def shutdown(self):
+        self.flush()
@@ -0,0 +1,184 @@
+try:
+    import usocket as socket
+except ImportError:
+    import socket
+
+from opentelemetry_client import ticks_ms, ticks_diff, Attributes, attribute_items, _raw_value
+
+# Fits one Ethernet frame with IP and UDP headers to spare; the DogStatsD default
+DEFAULT_MAX_DATAGRAM = 1432
+
+def _clean(text, reserved):
+    for ch in reserved:
+        if ch in text:
+            text = text.replace(ch, "_")
+    return text
+
+def _tag(key, value):
+    if isinstance(value, bool):
+        value = "true" if value else "false"
+    return _clean(str(key), ":|,#@\n") + ":" + _clean(str(value), "|,#@\n")
+
+class StatsdExporter:
+    """Send `send_*_metric` calls as DogStatsD lines over UDP instead of OTLP/HTTP.
+
+    Lines are packed into datagrams of at most `max_datagram` bytes. A
+    datagram is sent when the next line would not fit, once the oldest line
+    has waited `flush_interval_ms` (checked by `otel.poll()`), or on
+    `otel.flush()`. Nothing is read back. Attributes become tags, led by the
+    client's resource attributes. Creating the exporter routes the client's
+    `send_*_metric` calls to it; `Meter` instruments still export OTLP.
+    """
+    def __init__(self, client, host, port=8125, prefix="", max_datagram=DEFAULT_MAX_DATAGRAM, flush_interval_ms=1000):
+        self.client = client
+        self.host = host
+        self.port = port
+        self.prefix = prefix
+        self.flush_interval_ms = flush_interval_ms
+        self._buf = bytearray(max_datagram)
+        self._mv = memoryview(self._buf)
+        self._pos = 0
+        self._lines = 0
+        self._first_at = 0
+        self._addr = None
+        self._sock = None
+        self._resource = None
+        self._resource_tags = ""
+        # Tag strings of bound attribute sets, built on first use
+        self._bound_tags = {}
+        # (name, tags) -> last cumulative value(s), so sums go out as increments
+        self._totals = {}
+        self.datagrams_sent = 0
+        self.lines_sent = 0
+        self.lines_dropped = 0
+        client.metric_exporter = self
+        client.meters.append(self)
+
+    def _join(self, items):
+        tags = ",".join([_tag(k, v) for k, v in items])
+        if self._resource_tags:
+            return self._resource_tags + "," + tags if tags else self._resource_tags
+        return tags
+
+    def _tags(self, attributes):
+        resource = self.client.resource_attributes
+        plain = isinstance(resource, dict)
+        # A dict, the usual resource, is compared with a copy as that is cheapest;
+        # an OTLP list or bound handle by the key the client caches its envelopes on
+        key = resource if plain else self.client._resource_key()
+        if key != self._resource:
+            # Replaced or changed in place; rebuild what depends on it
+            self._resource = dict(resource) if plain else key
+            # Cleared first, since _join puts the current resource tags in front
+            self._resource_tags = ""
+            self._resource_tags = self._join(resource.items if isinstance(resource, Attributes) else attribute_items(resource))
+            self._bound_tags = {}
+        if not attributes:
+            return self._resource_tags
+        if isinstance(attributes, Attributes):
+            tags = self._bound_tags.get(attributes)
+            if tags is None:
+                tags = self._bound_tags[attributes] = self._join(attributes.items)
+            return tags
+        if isinstance(attributes, dict):
+            return self._join(attributes.items())
+        return self._join([(a["key"], _raw_value(a["value"])) for a in attributes])
+
+    def _increment(self, name, tags, value):
+        key = (name, tags)
+        last = self._totals.get(key)
+        self._totals[key] = value
+        if last is None or value < last:
+            # First report, or the device's counter was reset
+            return value
+        return value - last
+
+    def _line(self, name, value, kind, tags):
+        line = "%s%s:%s|%s" % (self.prefix, _clean(name, ":|@\n"), value, kind)
+        if tags:
+            line += "|#" + tags
+        self._add(line.encode())
+
+    def export_metric(self, name, value, metric_type, attributes, options):
+        tags = self._tags(attributes)
+        if metric_type == "gauge":
+            if value < 0:
+                # A signed gauge value means "change by"; reset to 0 first to set it
+                self._line(name, 0, "g", tags)
+            self._line(name, value, "g", tags)
+        elif metric_type == "sum":
+            delta = self._increment(name, tags, value)
+            if delta:
+                self._line(name, delta, "c", tags)
+        elif metric_type == "histogram":
+            # statsd has no bucketed type; send what was added to count and sum
+            count = options.get("count", 1)
+            total = options.get("sum", value)
+            key = (name, tags)
+            last = self._totals.get(key)
+            self._totals[key] = (count, total)
+            if last is not None and count >= last[0]:
+                count -= last[0]
+                total -= last[1]
+            if count:
+                self._line(name + ".count", count, "c", tags)
+                self._line(name + ".sum", total, "c", tags)
+        else:
+            raise ValueError("Unsupported metric_type: %s" % metric_type)
+
+    def _add(self, line):
+        n = len(line)
+        size = len(self._buf)
+        if self._pos and self._pos + 1 + n > size:
+            self._send()
+        if n > size:
+            # Too long to share a datagram; send it alone and let IP fragment it
+            self._sendto(line, 1)
+            return
+        if self._pos:
+            self._buf[self._pos] = 10
+            self._pos += 1
+        else:
+            self._first_at = ticks_ms()
+        self._mv[self._pos:self._pos + n] = line
+        self._pos += n
+        self._lines += 1
+
+    def _sendto(self, data, lines):
+        try:
+            if self._sock is None:
+                self._addr = socket.getaddrinfo(self.host, self.port, 0, socket.SOCK_DGRAM)[0][-1]
+                self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._sock.sendto(data, self._addr)
+        except OSError as e:
+            self.lines_dropped += lines
+            print("⚠️  statsd send failed:", e)
+            self.close()
+            return
+        self.datagrams_sent += 1
+        self.lines_sent += lines
+
+    def _send(self):
+        if self._pos:
+            self._sendto(self._mv[:self._pos], self._lines)
+            self._pos = 0
+            self._lines = 0
+
+    def poll(self):
+        if self._pos and ticks_diff(ticks_ms(), self._first_at) >= self.flush_interval_ms:
+            self._send()
+
+    def flush(self):
+        self._send()
+
+    def shutdown(self):
+        self._send()
+        self.close()
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
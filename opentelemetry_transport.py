@@ -0,0 +1,342 @@
+import io
+import sys
+
+try:
+    import usocket as socket
+except ImportError:
+    import socket
+
+_DRAIN_CHUNK = 128
+
+# Not every port exports these names; the values are the same on lwIP and Linux
+_IPPROTO_TCP = getattr(socket, "IPPROTO_TCP", 6)
+_TCP_NODELAY = getattr(socket, "TCP_NODELAY", 1)
+
+# errno values for a socket timeout: ETIMEDOUT, and EAGAIN on lwIP ports
+_TIMEOUT_ERRNOS = (110, 11)
+# CPython raises socket.timeout, which carries no errno; MicroPython has no such class
+_Timeout = getattr(socket, "timeout", ())
+
+def timed_out(e):
+    """True if the OSError `e` is a socket timeout rather than a closed or reset connection."""
+    return isinstance(e, _Timeout) or (bool(e.args) and e.args[0] in _TIMEOUT_ERRNOS)
+
+# MicroPython only lets json.dump and deflate.DeflateIO write to Python objects
+# that derive from io.IOBase; on CPython any object with write() will do.
+StreamBase = io.IOBase if sys.implementation.name == "micropython" else object
+
+def request_head(path, host_header, headers, body_header):
+    head = f"POST {path} HTTP/1.1\r\n" + host_header
+    if headers:
+        for key, value in headers.items():
+            head += f"{key}: {value}\r\n"
+    return (head + body_header + "\r\n").encode()
+
+def parse_header(line, framing):
+    """Update `framing` ([content length, chunked, keep alive]) from one response header line."""
+    name, _, value = line.partition(b":")
+    name = name.strip().lower()
+    if name == b"content-length":
+        framing[0] = int(value)
+    elif name == b"transfer-encoding":
+        framing[1] = b"chunked" in value.lower()
+    elif name == b"connection":
+        framing[2] = b"close" not in value.lower()
+
+class ChunkedWriter(StreamBase):
+    """Send writes as HTTP/1.1 chunks, assembled in a caller-owned buffer.
+
+    Each chunk is framed in place (fixed-width hex size, data, CRLF) and sent
+    with a single sendall, so no memory beyond `buf` is used however much is
+    written. The request head rides along with the first chunk and the
+    terminating zero-length chunk with the last; separate small writes would
+    stall on Nagle's algorithm and the collector's delayed ACK.
+    """
+    def __init__(self, sock, buf, head=b""):
+        self._sock = sock
+        self._mv = memoryview(buf)
+        # Leave room for the chunk's CRLF and the final "0\r\n\r\n"
+        self._end = len(buf) - 7
+        self._base = 0
+        if head:
+            if len(head) + 6 < self._end:
+                self._mv[:len(head)] = head
+                self._base = len(head)
+            else:
+                sock.sendall(head)
+        self._pos = self._base + 6
+        self.bytes_written = 0
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        data = memoryview(data)
+        n = len(data)
+        self.bytes_written += n
+        i = 0
+        while i < n:
+            take = min(self._end - self._pos, n - i)
+            self._mv[self._pos:self._pos + take] = data[i:i + take]
+            self._pos += take
+            i += take
+            if self._pos == self._end:
+                self._send(False)
+        return n
+
+    def finish(self):
+        self._send(True)
+
+    def _send(self, last):
+        mv = self._mv
+        base = self._base
+        end = self._pos
+        size = end - base - 6
+        if size:
+            mv[base:base + 4] = ("%04x" % size).encode()
+            mv[base + 4:base + 6] = b"\r\n"
+            mv[end:end + 2] = b"\r\n"
+            end += 2
+        else:
+            end = base
+        if last:
+            mv[end:end + 5] = b"0\r\n\r\n"
+            end += 5
+        if end:
+            self._sock.sendall(mv[:end])
+        self._base = 0
+        self._pos = 6
+
+class HTTPTransport:
+    """Minimal HTTP/1.1 client that keeps one connection to the collector open between exports.
+
+    The collector address is resolved once. Only the status line and the framing
+    headers of each response are parsed; the body is read and discarded so the
+    connection can be reused.
+    """
+    def __init__(self, host, port=4318, connect_timeout=2, read_timeout=3, buffer_size=512):
+        if not 16 <= buffer_size <= 0xFFFF:
+            raise ValueError("buffer_size must be between 16 and 65535")
+        self.host = host
+        self.port = int(port)
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._host_header = f"Host: {host}:{self.port}\r\n"
+        self._addr = None
+        self._sock = None
+        self._stream = None
+        self.buffer_size = buffer_size
+        self._buf = None
+
+    def _buffer(self):
+        if self._buf is None:
+            self._buf = bytearray(self.buffer_size)
+        return self._buf
+
+    def _address(self):
+        if self._addr is None:
+            self._addr = socket.getaddrinfo(self.host, self.port, 0, socket.SOCK_STREAM)[0][-1]
+        return self._addr
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(self.connect_timeout)
+            sock.connect(self._address())
+        except OSError:
+            sock.close()
+            # The address may have changed (DHCP, DNS); look it up again next time
+            self._addr = None
+            raise
+        sock.settimeout(self.read_timeout)
+        try:
+            # Streamed chunks are small writes; don't hold each one back until the previous is ACKed
+            sock.setsockopt(_IPPROTO_TCP, _TCP_NODELAY, 1)
+        except (OSError, AttributeError):
+            pass
+        self._sock = sock
+        # MicroPython returns the socket itself; CPython needs a buffered reader for readline()
+        self._stream = sock.makefile("rb")
+        return sock
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._stream = None
+
+    def _request(self, write_request):
+        # A kept-alive socket may have been closed by the collector since the
+        # last export. That shows as a failed write or as EOF before the status
+        # line, and only then is the request sent again on a fresh connection.
+        # A timeout means the collector may have the request already: no retry.
+        reused = self._sock is not None
+        while True:
+            sock = self._sock if self._sock is not None else self._connect()
+            stale = False
+            try:
+                try:
+                    write_request(sock)
+                    status_line = self._stream.readline()
+                except OSError as e:
+                    stale = reused and not timed_out(e)
+                    raise
+                if not status_line:
+                    stale = reused
+                    raise OSError("connection closed by collector")
+                return self._read_response(status_line)
+            except OSError:
+                self.close()
+                if not stale:
+                    raise
+                reused = False
+            except (ValueError, IndexError):
+                # A malformed status or chunk line: the stream is out of step, don't reuse it
+                self.close()
+                raise
+
+    def send(self, path, body, headers=None):
+        """POST `body` to `path` and return the response status code.
+
+        Raises OSError if the collector cannot be reached.
+        """
+        if isinstance(body, str):
+            body = body.encode()
+        head = request_head(path, self._host_header, headers, f"Content-Length: {len(body)}\r\n")
+
+        def write_request(sock):
+            # The head goes out with as much of the body as fits in the stream
+            # buffer, so a small export is one write and a large one never waits
+            # on the head's ACK, whether or not TCP_NODELAY could be set
+            buf = self._buffer()
+            n = len(head)
+            if n >= len(buf):
+                sock.sendall(head)
+                sock.sendall(body)
+                return
+            take = min(len(body), len(buf) - n)
+            mv = memoryview(buf)
+            mv[:n] = head
+            mv[n:n + take] = memoryview(body)[:take]
+            sock.sendall(mv[:n + take])
+            if take < len(body):
+                sock.sendall(memoryview(body)[take:])
+        return self._request(write_request)
+
+    def send_stream(self, path, produce, headers=None):
+        """POST a body generated by `produce(stream)` using chunked transfer encoding.
+
+        `produce` may be called again if a stale keep-alive connection has to be
+        replaced, so it must be able to regenerate the same body.
+        """
+        head = request_head(path, self._host_header, headers, "Transfer-Encoding: chunked\r\n")
+
+        def write_request(sock):
+            writer = ChunkedWriter(sock, self._buffer(), head)
+            produce(writer)
+            writer.finish()
+        return self._request(write_request)
+
+    def _read_response(self, status_line):
+        stream = self._stream
+        status = int(status_line.split(None, 2)[1])
+        framing = [None, False, not status_line.startswith(b"HTTP/1.0")]
+        while True:
+            line = stream.readline()
+            if not line or line == b"\r\n":
+                break
+            parse_header(line, framing)
+        length, chunked, keep_alive = framing
+        if chunked:
+            while True:
+                size = int(stream.readline().split(b";")[0], 16)
+                self._drain(size + 2)
+                if size == 0:
+                    break
+        elif length is not None:
+            self._drain(length)
+        else:
+            # No framing, the body runs until the collector closes the socket
+            keep_alive = False
+        if not keep_alive:
+            self.close()
+        return status
+
+    def _drain(self, n):
+        stream = self._stream
+        while n > 0:
+            chunk = stream.read(min(n, _DRAIN_CHUNK))
+            if not chunk:
+                raise OSError("connection closed by collector")
+            n -= len(chunk)
+
+class UrequestsTransport:
+    """The original transport: a new `urequests.post` connection for every export."""
+    def __init__(self, host, port=4318):
+        self.url = f"http://{host}:{port}"
+
+    def send(self, path, body, headers=None):
+        import urequests
+        response = urequests.post(self.url + path, data=body, headers=headers or {})
+        status = response.status_code
+        response.close()
+        return status
+
+    def close(self):
+        pass
+
+# Topic level for each Content-Type, so a bridge knows how to decode a payload
+_MQTT_FORMATS = {"application/json": "json", "application/x-protobuf": "protobuf"}
+
+class MQTTTransport:
+    """Publish exports on an MQTT session the application already has open.
+
+    `mqtt` is a connected `umqtt.simple.MQTTClient` (anything with a
+    compatible `publish` will do). Each export becomes one message on
+    `<topic_prefix>/v1/<signal>/<json|protobuf>`, with `/gzip` or `/deflate`
+    appended when the payload is compressed, and a gateway bridges it to the
+    collector. The session belongs to the application, so `close` leaves it
+    connected.
+    """
+    def __init__(self, mqtt, topic_prefix="otlp", qos=0, max_payload=None):
+        if qos not in (0, 1):
+            raise ValueError("qos must be 0 or 1")
+        self.mqtt = mqtt
+        self.topic_prefix = topic_prefix.rstrip("/")
+        self.qos = qos
+        # Brokers drop (and some disconnect on) messages above their limit; reject those here instead
+        self.max_payload = max_payload
+        self._topics = {}
+
+    def topic(self, path, headers=None):
+        content_type = encoding = None
+        if headers:
+            content_type = headers.get("Content-Type")
+            encoding = headers.get("Content-Encoding")
+        key = (path, content_type, encoding)
+        topic = self._topics.get(key)
+        if topic is None:
+            topic = self.topic_prefix + path + "/" + _MQTT_FORMATS.get(content_type, "json")
+            if encoding:
+                topic += "/" + encoding
+            topic = self._topics[key] = topic.encode()
+        return topic
+
+    def send(self, path, body, headers=None):
+        """Publish `body` and return an HTTP-style status code.
+
+        200 means the message was written to the broker (and acknowledged
+        for qos=1), 413 that it is larger than `max_payload`. Raises OSError
+        if the session is down; reconnecting it is up to the application.
+        """
+        if isinstance(body, str):
+            body = body.encode()
+        if self.max_payload is not None and len(body) > self.max_payload:
+            return 413
+        self.mqtt.publish(self.topic(path, headers), body, False, self.qos)
+        return 200
+
+    def close(self):
+        pass